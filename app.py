@@ -1,8 +1,10 @@
+import startup_profile
+startup_profile.enable()  # TINA_PROFILE_IMPORTS=1: time every import from here on
+
 import streamlit as st
+import assets
 import auth
-import dashboard
-import roster
-import incidents
+# dashboard / roster (pandas, LangChain, fpdf behind them) are imported after login, see main()
 
 # Set Page Configuration
 st.set_page_config(
@@ -22,8 +24,8 @@ background_style = """
     background-attachment: fixed;
 """
 
-st.markdown(f"""
-<style>
+# Injected into the page once per session (see assets.inject_css)
+assets.inject_css("theme", f"""
     /* 0. Animations */
     @keyframes fadeIn {{
         from {{ opacity: 0; transform: translateY(20px); }}
@@ -179,8 +181,7 @@ st.markdown(f"""
     
 
     
-</style>
-""", unsafe_allow_html=True)
+""")
 
 def init_session_state():
     if 'authenticated' not in st.session_state:
@@ -199,8 +200,8 @@ def main():
         # -----------------------------------------------------------------------------
         # GLOBAL HEADER BANNER
         # -----------------------------------------------------------------------------
-        st.markdown("""
-        <style>
+        assets.remove_css("login")
+        banner_css = """
         @keyframes float {
             0% { transform: translateY(0px) rotate(0deg); }
             50% { transform: translateY(-10px) rotate(2deg); }
@@ -242,6 +243,10 @@ def main():
         }
         .avatar-img {
             height: 90px;
+            width: 90px;
+            flex-shrink: 0;
+            background-size: cover;
+            background-position: center;
             margin-right: 20px;
             border-radius: 50%;
             box-shadow: 0 0 25px rgba(0, 247, 255, 0.6);
@@ -275,23 +280,20 @@ def main():
             position: relative;
             z-index: 2;
         }
-        </style>
-        """, unsafe_allow_html=True)
+        """
 
-        # Load Banner Image
+        # Load Banner Image (encoded once per process, sent inside the banner style sheet)
         try:
-            import base64
-            def get_base64_image(image_path):
-                with open(image_path, "rb") as img_file:
-                    return base64.b64encode(img_file.read()).decode()
-            
-            tina_img_b64 = get_base64_image("tina_avatar.png")
-            icon_html = f'<img src="data:image/png;base64,{tina_img_b64}" class="avatar-img">'
-        except FileNotFoundError:
-            icon_html = '⚡' # Fallback if image not found
+            tina_img_uri = assets.image_data_uri("tina_avatar.png")
+            if tina_img_uri:
+                banner_css += f'.avatar-img {{ background-image: url("{tina_img_uri}"); }}'
+                icon_html = '<div class="avatar-img"></div>'
+            else:
+                icon_html = '⚡' # Fallback if image not found
         except Exception as e:
             icon_html = '⚡' # General fallback for other errors
             st.error(f"Error loading Tina avatar: {e}")
+        assets.inject_css("banner", banner_css)
 
         st.markdown(f"""
         <div class="banner-container">
@@ -320,11 +322,20 @@ def main():
                 st.session_state['username'] = None
                 st.rerun()
 
-        # Page Routing
+        # Page Routing (modules are imported on first use, the login page never loads them)
         if nav_selection == "Dashboard":
+            import dashboard
             dashboard.render_dashboard()
         elif nav_selection == "Shift Roster":
+            import roster
             roster.render_roster_page()
 
+def render_startup_profile():
+    profile = startup_profile.report_once()
+    if profile:
+        with st.sidebar.expander("⏱️ Startup Import Profile"):
+            st.code(profile, language=None)
+
 if __name__ == "__main__":
     main()
+    render_startup_profile()
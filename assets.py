@@ -0,0 +1,82 @@
+"""
+Static assets and page styling for the Streamlit UI.
+
+Images are read and base64-encoded once per process (st.cache_resource) instead of on
+every rerun. Style sheets are fingerprinted and written into the page <head> once per
+browser session: later reruns send nothing, and a sheet is re-sent only when its text
+changes. Large images used by the styling (login background, Tina's avatar) travel
+inside those sheets, so they too reach the browser once per session.
+"""
+import os
+import json
+import base64
+import hashlib
+import streamlit as st
+
+ASSET_DIR = os.getenv("TINA_ASSET_DIR", os.path.dirname(os.path.abspath(__file__)))
+
+@st.cache_resource(show_spinner=False)
+def image_data_uri(name, mime="image/png"):
+    """data: URI of an image in ASSET_DIR, encoded once per process; None if the file is missing."""
+    try:
+        with open(os.path.join(ASSET_DIR, name), "rb") as f:
+            return f"data:{mime};base64,{base64.b64encode(f.read()).decode()}"
+    except FileNotFoundError:
+        return None
+
+# ----------------------------------------------------------------------
+# One-time CSS injection
+# ----------------------------------------------------------------------
+# The sheet lives in the parent document's <head>, outside Streamlit's element tree, so
+# it survives reruns that no longer emit it. Sheets are keyed by slot: re-injecting a
+# slot replaces its text in place, remove_css() takes it out (e.g. the login styling
+# after signing in).
+_HEAD_SCRIPT = """
+<script>
+    (function() {
+        var doc = window.parent.document;
+        var style = doc.getElementById(%(element_id)s);
+        if (%(css)s === null) {
+            if (style) style.remove();
+            return;
+        }
+        if (!style) {
+            style = doc.createElement("style");
+            style.id = %(element_id)s;
+            doc.head.appendChild(style);
+        }
+        if (style.dataset.fingerprint !== %(fingerprint)s) {
+            style.textContent = %(css)s;
+            style.dataset.fingerprint = %(fingerprint)s;
+        }
+    })();
+</script>
+"""
+
+def css_fingerprint(css):
+    return hashlib.sha1(css.encode()).hexdigest()[:16]
+
+def _js(value):
+    return json.dumps(value).replace("</", "<\\/")
+
+def _send_head_script(slot, css, fingerprint):
+    st.components.v1.html(_HEAD_SCRIPT % {
+        'element_id': _js(f"tina-css-{slot}"),
+        'css': _js(css),
+        'fingerprint': _js(fingerprint),
+    }, height=0, width=0)
+
+def inject_css(slot, css):
+    """Puts `css` into the page as the `slot` style sheet, once per session (again only when it changes)."""
+    fingerprint = css_fingerprint(css)
+    injected = st.session_state.setdefault('injected_css', {})
+    if injected.get(slot) == fingerprint:
+        return
+    _send_head_script(slot, css, fingerprint)
+    injected[slot] = fingerprint
+
+def remove_css(slot):
+    """Takes the `slot` style sheet out of the page, if this session injected it."""
+    injected = st.session_state.setdefault('injected_css', {})
+    if injected.pop(slot, None) is not None:
+        _send_head_script(slot, None, None)
@@ -1,11 +1,6 @@
 import streamlit as st
 import time
-import base64
-
-def get_base64_bin_file(bin_file):
-    with open(bin_file, 'rb') as f:
-        data = f.read()
-    return base64.b64encode(data).decode()
+import assets
 
 def init_user_db():
     if 'users_db' not in st.session_state:
@@ -18,13 +13,14 @@ def check_credentials(username, password):
     return username in db and db[username] == password
 
 def set_bg_and_style():
-    # Set Background Image for Login Page
+    # Set Background Image for Login Page (image encoded once per process, sheet sent once per session)
     try:
-        img_b64 = get_base64_bin_file("telefonica_o2_login_v2.png")
-        st.markdown(f"""
-        <style>
+        img_uri = assets.image_data_uri("telefonica_o2_login_v2.png")
+        if img_uri is None:
+            return
+        assets.inject_css("login", f"""
         .stApp {{
-            background-image: url("data:image/png;base64,{img_b64}");
+            background-image: url("{img_uri}");
             background-size: cover;
             background-position: center;
             background-repeat: no-repeat;
@@ -47,8 +43,7 @@ def set_bg_and_style():
             cursor: pointer;
             border-bottom: 1px solid #1e3a8a;
         }}
-        </style>
-        """, unsafe_allow_html=True)
+        """)
     except Exception as e:
         pass
 
@@ -1,11 +1,241 @@
 import streamlit as st
-import pandas as pd
 import incidents
+import incident_store
 import llm_utils
+import processing
+import roster
 import time
+import os
+import atexit
+import shutil
+import tempfile
+
+# ----------------------------------------------------------------------
+# Auto-refreshing fragments
+# ----------------------------------------------------------------------
+# The countdown, processing status and counters re-run on their own every
+# REFRESH_SECONDS (st.fragment run_every) and redraw only their own region. The rest
+# of the page (header, filters, incident table) is re-run only once the incident
+# store has changed since it was drawn.
+REFRESH_SECONDS = 1
+AUTO_ASSIGN_DELAY_SECONDS = 5
+
+def _run_fragment(func, active, *args):
+    """Runs `func` as a fragment that refreshes itself every REFRESH_SECONDS while `active`."""
+    st.fragment(func, run_every=REFRESH_SECONDS if active else None)(*args)
+
+def _rerun_if_changed(store):
+    """Full rerun when the store moved past the version the page was drawn from (at most once per tick)."""
+    version, drawn_at = st.session_state.get('dashboard_drawn', (None, 0))
+    if store.version != version and time.time() - drawn_at >= REFRESH_SECONDS:
+        st.rerun()
+
+def _countdown_timer():
+    """Auto-assignment countdown; hands over to background processing when it runs out."""
+    if 'auto_process_trigger' not in st.session_state:
+        return
+    remaining = AUTO_ASSIGN_DELAY_SECONDS - (time.time() - st.session_state['auto_process_trigger'])
+    if remaining <= 0:
+        del st.session_state['auto_process_trigger']
+        st.session_state['processing_active'] = True
+        st.rerun()
+
+    st.markdown(
+        f'<p style="text-align: left; color: #ef4444; font-size: 1.2rem; font-weight: bold; margin-bottom: 5px;">⏳ Auto-Assignment in {int(remaining)}s</p>', 
+        unsafe_allow_html=True
+    )
+    
+    # Countdown Tick Sound
+    tick_js = """
+    <script>
+        (function() {
+            var audioCtx = new (window.AudioContext || window.webkitAudioContext)();
+            var oscillator = audioCtx.createOscillator();
+            var gainNode = audioCtx.createGain();
+            
+            oscillator.connect(gainNode);
+            gainNode.connect(audioCtx.destination);
+            
+            oscillator.type = 'sine';
+            oscillator.frequency.setValueAtTime(800, audioCtx.currentTime); // 800Hz beep
+            gainNode.gain.setValueAtTime(0.1, audioCtx.currentTime);
+            
+            oscillator.start();
+            oscillator.stop(audioCtx.currentTime + 0.1); // Short 100ms beep
+        })();
+    </script>
+    """
+    st.components.v1.html(tick_js, height=0, width=0)
+
+# ----------------------------------------------------------------------
+# Incident table styling
+# ----------------------------------------------------------------------
+DARK_THEMES = ("Dark", "Midnight Blue", "High Contrast")
+
+# Bright/Neon colors for Dark Backgrounds
+DARK_COLORS = {
+    'Critical': '#ff5252', # Bright Red
+    'High': '#ffab40',     # Bright Orange
+    'Medium': '#ffff00',   # Bright Yellow
+    'Low': '#69f0ae',      # Bright Green
+    'Assigned': '#ff5252',
+    'In Progress': '#40c4ff', # Bright Blue
+    'Correlated': '#b0bec5', # Grey (child of an alert storm)
+    'Resolved': '#69f0ae'
+}
+
+# Dark colors for Light Backgrounds
+LIGHT_COLORS = {
+    'Critical': '#d32f2f', # Dark Red
+    'High': '#f57c00',     # Dark Orange
+    'Medium': '#fbc02d',   # Dark Yellow
+    'Low': '#388e3c',      # Dark Green
+    'Assigned': '#d32f2f',
+    'Assigned (No Roster)': '#d32f2f', # Keep same red
+    'In Progress': '#1976d2', # Dark Blue
+    'Correlated': '#757575', # Grey (child of an alert storm)
+    'Resolved': '#388e3c'
+}
+
+def _css_palette(colors):
+    """value -> cell CSS, plus the fallback for unknown Priority / Status values."""
+    css = {value: f'color: {color}; font-weight: bold;' for value, color in colors.items()}
+    return css, {'Priority': css['Medium'], 'Status': css['Resolved']}
+
+# Built once at import: (css by value, fallback by column) per theme brightness
+CELL_STYLES = {True: _css_palette(DARK_COLORS), False: _css_palette(LIGHT_COLORS)}
+
+def _color_column(col, css, fallback):
+    if col.name not in fallback:
+        return [''] * len(col)
+    return incident_store.map_values(col, css, fallback[col.name])
+
+def style_incidents(df, is_dark):
+    """Styler colouring Priority and Status column-wise from the precomputed palette."""
+    css, fallback = CELL_STYLES[bool(is_dark)]
+    return df.style.apply(_color_column, subset=['Priority', 'Status'], css=css, fallback=fallback)
+
+def _incident_counters(store):
+    st.info(f"Active Incidents: {store.count()}")
+    if st.session_state.get('processing_active'):
+        stats = processing.get_processing_service().stats()
+        st.caption(f"Queued: **{stats['queued']}** · Done: **{stats['completed']}** · Correlated: **{stats['correlated']}**")
+
+def _processing_status(store):
+    """Background processing (the service assigns tickets on its own; this view only polls for results)."""
+    if not st.session_state.get('processing_active'):
+        return
+    if roster.get_roster() is None:
+        # Pending tickets are shared by every session: never claim them without a roster
+        st.session_state['processing_active'] = False
+        st.warning("⏸️ Auto-assignment paused until a Shift Roster is loaded. Pending tickets stay queued.")
+        return
+    service = processing.get_processing_service()
+    session_key = processing.current_session_key()
+    if not st.session_state.get('processing_started'):
+        # Switch the dispatcher on once; it carries on even if this tab goes away
+        service.start(session_key)
+        st.session_state['processing_started'] = True
+    # Use a status container for stable feedback
+    with st.status("Agent Tina is working...", expanded=True) as status:
+        # Notify about whatever the workers finished since the last poll (already saved to the store)
+        feedback_list = service.drain(session_key)
+        for ticket_feedback in feedback_list:
+            if ticket_feedback.get('warning'):
+                st.warning(ticket_feedback['warning'])
+
+        if feedback_list:
+            # Immediate UI Feedback per ticket in the batch
+            # st.toast(ticket_feedback['toast'], icon="🛡️") # Removed per user request
+            for ticket_feedback in feedback_list:
+                if ticket_feedback.get('email_sent'):
+                    st.toast(f"📧 Email sent to {ticket_feedback.get('assignee_name', 'User')}", icon="📨")
+                    
+                if ticket_feedback.get('teams_sent'):
+                    st.toast(f"💬 Teams message sent to {ticket_feedback.get('assignee_name', 'User')}", icon="💬")
+            
+            # Immediate Voice: the ticket's own message for a single ticket, a summary for a batch
+            assigned = [fb for fb in feedback_list if fb.get('voice')]
+            if len(assigned) == 1:
+                voice_text = assigned[0]['voice']
+            elif assigned:
+                voice_text = f"Hi team, {len(assigned)} new incidents have been assigned. Kindly check and take action. Thank you!"
+            else:
+                voice_text = ""
+            
+            sound_js = f"""
+            <script>
+                (function() {{
+                    // Create and configure the utterance
+                    var msg = new SpeechSynthesisUtterance("{voice_text}");
+                    
+                    // Soft, professional settings
+                    msg.rate = 0.9; 
+                    msg.pitch = 1.0;
+                    msg.volume = 1.0;
+                    
+                    function setVoice() {{
+                        var voices = window.speechSynthesis.getVoices();
+                        var target = voices.find(v => v.name.includes("Samantha") || v.name.includes("Zira") || v.name.includes("Female") || (v.name.includes("Google") && v.name.includes("English")));
+                        if (target) msg.voice = target;
+                        
+                        // Speak only if not already speaking to avoid repeats, 
+                        // though st.rerun usually handles fresh injections.
+                        window.speechSynthesis.speak(msg);
+                    }}
+
+                    if (window.speechSynthesis.getVoices().length > 0) {{
+                        setVoice();
+                    }} else {{
+                        window.speechSynthesis.onvoiceschanged = setVoice;
+                    }}
+                }})();
+            </script>
+            """
+            if voice_text:
+                st.components.v1.html(sound_js, height=0, width=0)
+
+        in_flight = service.in_flight()
+        if service.active or in_flight:
+            # Keep polling for notifications
+            status.update(label=f"Agent Tina is working on {in_flight} incident(s)...", state="running")
+            _rerun_if_changed(store)
+        else:
+            st.session_state['processing_active'] = False
+            st.session_state['processing_started'] = False
+            status.update(label="All incidents processed!", state="complete", expanded=False)
+            st.rerun()
+
+# ----------------------------------------------------------------------
+# Guide exports
+# ----------------------------------------------------------------------
+# Export ZIPs are written to one temp directory per server process, removed when the
+# process exits. Sessions that are abandoned never delete their last export, so every
+# new export also sweeps out files older than EXPORT_TTL_SECONDS.
+EXPORT_TTL_SECONDS = int(os.getenv("TINA_EXPORT_TTL", "3600"))
+
+@st.cache_resource
+def _export_dir():
+    path = tempfile.mkdtemp(prefix="tina_exports_")
+    atexit.register(shutil.rmtree, path, ignore_errors=True)
+    return path
+
+def _new_export_file():
+    """Open temp file for a new export, after removing exports older than EXPORT_TTL_SECONDS."""
+    export_dir = _export_dir()
+    os.makedirs(export_dir, exist_ok=True)  # in case a tmp cleaner removed it
+    cutoff = time.time() - EXPORT_TTL_SECONDS
+    for entry in os.scandir(export_dir):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass  # Already gone (another session swept it)
+    return tempfile.NamedTemporaryFile(prefix="tina_guides_", suffix=".zip", dir=export_dir, delete=False)
 
 def render_dashboard():
     st.header("Incident Dashboard")
+    store = incident_store.get_incident_store()
     
     # ------------------------------------------------------------------
     # Feedback Display (Post-Processing)
@@ -36,90 +266,19 @@ def render_dashboard():
             st.components.v1.html(sound_js, height=0, width=0)
         del st.session_state['process_feedback']
 
-    needs_timer_rerun = False
-    if 'auto_process_trigger' in st.session_state:
-        start_time = st.session_state['auto_process_trigger']
-        elapsed = time.time() - start_time
-        remaining = 5 - elapsed 
-        
-        if remaining <= 0:
-            del st.session_state['auto_process_trigger']
-            st.session_state['processing_active'] = True
-            st.rerun()
-        else:
-            needs_timer_rerun = True
+    # Auto-refreshing regions: only these redraw every second
+    st.session_state['dashboard_drawn'] = (store.version, time.time())
+    _run_fragment(_processing_status, st.session_state.get('processing_active'), store)
 
-    # Sequential Processing Logic (Prevents Freeze)
-    if st.session_state.get('processing_active'):
-        # Use a status container for stable feedback
-        with st.status("Agent Tina is working...", expanded=True) as status:
-            status.update(label="Agent Tina: Actioning next incident...", state="running")
-            ticket_feedback = incidents.process_tickets()
-            
-            if ticket_feedback:
-                # Immediate UI Feedback for ONE ticket
-                # st.toast(ticket_feedback['toast'], icon="🛡️") # Removed per user request
-                
-                if ticket_feedback.get('email_sent'):
-                    st.toast(f"📧 Email sent to {ticket_feedback.get('assignee_name', 'User')}", icon="📨")
-                    time.sleep(1.5) # Give time to read
-                    
-                if ticket_feedback.get('teams_sent'):
-                    st.toast(f"💬 Teams message sent to {ticket_feedback.get('assignee_name', 'User')}", icon="💬")
-                
-                # Immediate Voice for ONE ticket
-                sound_js = f"""
-                <script>
-                    (function() {{
-                        // Create and configure the utterance
-                        var msg = new SpeechSynthesisUtterance("{ticket_feedback['voice']}");
-                        
-                        // Soft, professional settings
-                        msg.rate = 0.9; 
-                        msg.pitch = 1.0;
-                        msg.volume = 1.0;
-                        
-                        function setVoice() {{
-                            var voices = window.speechSynthesis.getVoices();
-                            var target = voices.find(v => v.name.includes("Samantha") || v.name.includes("Zira") || v.name.includes("Female") || (v.name.includes("Google") && v.name.includes("English")));
-                            if (target) msg.voice = target;
-                            
-                            // Speak only if not already speaking to avoid repeats, 
-                            // though st.rerun usually handles fresh injections.
-                            window.speechSynthesis.speak(msg);
-                        }}
-
-                        if (window.speechSynthesis.getVoices().length > 0) {{
-                            setVoice();
-                        }} else {{
-                            window.speechSynthesis.onvoiceschanged = setVoice;
-                        }}
-                    }})();
-                </script>
-                """
-                st.components.v1.html(sound_js, height=0, width=0)
-                
-                # Visual feedback during the wait
-                assignee = ticket_feedback.get('assignee_name', 'assignee')
-                status.update(label=f"Agent Tina is notifying {assignee}...", state="running")
-                time.sleep(2.5) 
-                st.rerun()
-            else:
-                st.session_state['processing_active'] = False
-                status.update(label="All incidents processed!", state="complete", expanded=False)
-                time.sleep(0.5)
-                st.rerun()
+    # LLM Availability Warning (circuit breaker open -> offline templates)
+    breaker = llm_utils.get_llm_breaker_stats()
+    if breaker['state'] == 'open':
+        st.warning(f"⚠️ Gemini is not responding. Serving offline resolution templates (next retry in {int(breaker['retry_in'])}s).")
 
     # Roster Check Warning
-    if 'roster_df' not in st.session_state or st.session_state['roster_df'].empty:
-        st.warning("⚠️ No Shift Roster found. Auto-assignment will fail. Please go to 'Shift Roster' and generate/upload one.")
+    if roster.get_roster() is None:
+        st.warning("⚠️ No Shift Roster found. Auto-assignment is paused until one is loaded. Please go to 'Shift Roster' and generate/upload one.")
     
-    # Initialize Incidents in Session State if empty
-    if 'incidents_df' not in st.session_state:
-        st.session_state['incidents_df'] = pd.DataFrame(columns=[
-            'TicketID', 'Description', 'Status', 'Assignment Group', 'Assigned To', 'Notes', 'Created At'
-        ])
-
     st.divider()
 
     # Top Stats & Filters
@@ -127,12 +286,15 @@ def render_dashboard():
     
     with col1:
         assignment_groups = llm_utils.ASSIGNMENT_GROUPS
-        with st.popover("🔽 Filter Groups", use_container_width=False):
+        with st.popover("🔽 Filter Incidents", use_container_width=False):
              selected_groups = st.multiselect(
                 "Select Assignment Groups", 
                 options=assignment_groups,
                 default=[]
             )
+             selected_statuses = st.multiselect("Status", options=sorted(store.status_counts()), default=[])
+             selected_priorities = st.multiselect("Priority", options=incidents.PRIORITIES, default=[])
+             search_text = st.text_input("Search Ticket ID / Description").strip()
         
         if not selected_groups:
             st.caption("Showing: **All Groups**")
@@ -140,7 +302,11 @@ def render_dashboard():
             st.caption(f"Showing: **{len(selected_groups)} Group(s)** selected")
     
     with col2:
-        st.info(f"Active Incidents: {len(st.session_state['incidents_df'])}")
+        _run_fragment(
+            _incident_counters,
+            st.session_state.get('processing_active') or 'auto_process_trigger' in st.session_state,
+            store,
+        )
 
     # Manual Trigger Section (Task 4)
     # Manual Trigger Section (Task 4) - Compacted Left Align
@@ -154,7 +320,7 @@ def render_dashboard():
             
             with t_col1:
                 trigger_type = st.radio("Source", ["Event", "User"])
-                count = st.number_input("Count", min_value=1, max_value=20, value=5)
+                count = st.number_input("Count", min_value=1, max_value=incidents.MAX_GENERATED_INCIDENTS, value=5)
             with t_col2:
                 target_group = st.selectbox("Target Group", ["Random"] + llm_utils.ASSIGNMENT_GROUPS)
                 st.write("") # Spacer
@@ -170,112 +336,33 @@ def render_dashboard():
 
     st.divider()
 
-    # Display Data
-    if not st.session_state['incidents_df'].empty:
-        # Filtering
-        if selected_groups:
-            filtered_df = st.session_state['incidents_df'][
-                st.session_state['incidents_df']['Assignment Group'].isin(selected_groups)
-            ]
-        else:
-            filtered_df = st.session_state['incidents_df']
-        
-        # Ensure new columns exist (for backward compatibility during session)
-        if 'Priority' not in filtered_df.columns:
-            filtered_df['Priority'] = 'Medium'
-        if 'CI Type' not in filtered_df.columns:
-            filtered_df['CI Type'] = 'Unknown'
-
-        # Styling Function
-        def highlight_vals(row):
-            styles = [''] * len(row)
-            
-            # Determine Color Palette based on Theme
-            current_theme = st.session_state.get('theme', 'Light')
-            is_dark = current_theme in ["Dark", "Midnight Blue", "High Contrast"]
-            
-            if is_dark:
-                 # Bright/Neon colors for Dark Backgrounds
-                 colors = {
-                     'Critical': '#ff5252', # Bright Red
-                     'High': '#ffab40',     # Bright Orange
-                     'Medium': '#ffff00',   # Bright Yellow
-                     'Low': '#69f0ae',      # Bright Green
-                     'Assigned': '#ff5252',
-                     'In Progress': '#40c4ff', # Bright Blue
-                     'Resolved': '#69f0ae'
-                 }
-            else:
-                 # Dark colors for Light Backgrounds
-                 colors = {
-                     'Critical': '#d32f2f', # Dark Red
-                     'High': '#f57c00',     # Dark Orange
-                     'Medium': '#fbc02d',   # Dark Yellow
-                     'Low': '#388e3c',      # Dark Green
-                     'Assigned': '#d32f2f',
-                     'Assigned (No Roster)': '#d32f2f', # Keep same red
-                     'In Progress': '#1976d2', # Dark Blue
-                     'Resolved': '#388e3c'
-                 }
-
-            # Priority Color Coding
-            pri_val = row['Priority']
-            color = colors.get(pri_val, colors['Medium'])
-            
-            # Find Priority index
-            pri_idx = row.index.get_loc('Priority')
-            styles[pri_idx] = f'color: {color}; font-weight: bold;'
-            
-            # Status Color Coding
-            stat_val = row['Status']
-            s_color = colors.get(stat_val, colors['Resolved'])
-                
-            stat_idx = row.index.get_loc('Status')
-            styles[stat_idx] = f'color: {s_color}; font-weight: bold;'
-            
-            return styles
-
-        # Apply Styling
-        # Note: highlighting rows requires style.apply with axis=1
-        # Prepare DataFrame for Display (Exclude Binary PDF Data to prevent Unicode Errors)
-        display_cols = [c for c in filtered_df.columns if c != 'PDF_Bytes']
-        display_df = filtered_df[display_cols]
-
-        # Timer: Left-aligned above table
-        if 'auto_process_trigger' in st.session_state:
-            start_time = st.session_state['auto_process_trigger']
-            elapsed = time.time() - start_time
-            remaining = 5 - elapsed
-            if remaining > 0:
-                st.markdown(
-                    f'<p style="text-align: left; color: #ef4444; font-size: 1.2rem; font-weight: bold; margin-bottom: 5px;">⏳ Auto-Assignment in {int(remaining)}s</p>', 
-                    unsafe_allow_html=True
-                )
-                
-                # Countdown Tick Sound
-                tick_js = """
-                <script>
-                    (function() {
-                        var audioCtx = new (window.AudioContext || window.webkitAudioContext)();
-                        var oscillator = audioCtx.createOscillator();
-                        var gainNode = audioCtx.createGain();
-                        
-                        oscillator.connect(gainNode);
-                        gainNode.connect(audioCtx.destination);
-                        
-                        oscillator.type = 'sine';
-                        oscillator.frequency.setValueAtTime(800, audioCtx.currentTime); // 800Hz beep
-                        gainNode.gain.setValueAtTime(0.1, audioCtx.currentTime);
-                        
-                        oscillator.start();
-                        oscillator.stop(audioCtx.currentTime + 0.1); // Short 100ms beep
-                    })();
-                </script>
-                """
-                st.components.v1.html(tick_js, height=0, width=0)
+    # Timer: Left-aligned above table
+    _run_fragment(_countdown_timer, 'auto_process_trigger' in st.session_state)
+
+    # Display Data (one page at a time from the incident store; filtering happens in SQL)
+    table_filter = dict(statuses=selected_statuses, priorities=selected_priorities, search=search_text)
+    total_rows = store.count(selected_groups, **table_filter)
+    if total_rows:
+        p_col1, p_col2, p_col3, _ = st.columns([1, 1, 1, 3])
+        with p_col1:
+            page_size = st.selectbox("Rows per page", [25, 50, 100, 250], index=1)
+        with p_col2:
+            sort_by = st.selectbox("Sort by", list(incident_store.SORT_ORDERS))
+        total_pages = max(1, -(-total_rows // page_size))
+        with p_col3:
+            # Oldest-first opens on the last page (newest tickets), every other order on the first
+            default_page = total_pages if sort_by == 'Oldest first' else 1
+            page = st.number_input(f"Page (of {total_pages})", min_value=1, max_value=total_pages, value=default_page)
+        filtered_df = store.query_page(
+            selected_groups, limit=page_size, offset=(page - 1) * page_size, sort=sort_by, **table_filter
+        )
+
+        # Apply Styling: one vectorised lookup per coloured column, only for the visible page
+        is_dark = st.session_state.get('theme', 'Light') in DARK_THEMES
+        display_df = style_incidents(filtered_df, is_dark)
 
         st.dataframe(
-            display_df.style.apply(highlight_vals, axis=1),
+            display_df,
             column_order=["TicketID", "Description", "Recommendation", "CI Name", "Manufacturer", "CI Type", "Priority", "Status", "Assignment Group", "Assigned To", "Notes", "Created At"],
             use_container_width=False,
             column_config={
@@ -298,28 +385,107 @@ def render_dashboard():
             with c1:
                 ticket_to_download = st.selectbox("Select Ticket to Download PDF", pdf_candidates['TicketID'].unique())
             with c2:
-                # Find the row
-                row = pdf_candidates[pdf_candidates['TicketID'] == ticket_to_download].iloc[0]
-                pdf_data = row.get('PDF_Bytes')
-                
-                if pdf_data:
+                # Find the row and render its guide on demand (cached by size-bounded LRU)
+                row = store.get_by_ticket(ticket_to_download)
+                try:
+                    pdf_data = llm_utils.get_pdf_recommendation(
+                        ticket_to_download, row['Description'], row['Recommendation'], row['Manufacturer']
+                    )
+                except Exception as e:
+                    # Never let one bad guide take down the rest of the page
+                    st.warning(f"Could not render the PDF for {ticket_to_download}: {e}")
+                else:
                     st.download_button(
                         label="📄 Download PDF",
                         data=pdf_data,
                         file_name=f"Resolution_{ticket_to_download}.pdf",
                         mime="application/pdf"
                     )
-                else:
-                    st.info("Generating PDF...")
+            # Regenerate the guide live: steps appear as Gemini writes them
+            if st.button("✨ Live Resolution"):
+                outcome = {}
+                text = st.write_stream(llm_utils.stream_resolution_steps(
+                    row['Description'], row['Assignment Group'], row['Manufacturer'], row['CI Type'], outcome=outcome
+                ))
+                if isinstance(text, str) and text:
+                    store.update_incidents({store.row_id_for_ticket(ticket_to_download): {
+                        'Recommendation': text, 'Recommendation Source': outcome.get('source'),
+                    }})
         else:
             st.caption("No processed tickets available for download yet.")
+
+        # Close tickets: frees the assignee's capacity for the load-aware assignment
+        open_tickets = filtered_df[filtered_df['Status'] == 'In Progress']
+        if not open_tickets.empty:
+            r1, r2 = st.columns([3, 1])
+            with r1:
+                to_resolve = st.multiselect("Mark tickets as Resolved", open_tickets['TicketID'].tolist())
+            with r2:
+                st.write("") # Spacer
+                if st.button("✅ Resolve", disabled=not to_resolve):
+                    incidents.mark_resolved([store.row_id_for_ticket(t) for t in to_resolve])
+                    st.rerun()
+
+        # Bulk Export (shift handover): every processed guide of the selected groups in one ZIP
+        processed_total = store.count_processed(selected_groups)
+        if processed_total:
+            e_col1, e_col2 = st.columns([3, 1])
+            with e_col1:
+                st.caption(f"Shift handover: export all **{processed_total}** resolution guides as one ZIP.")
+            with e_col2:
+                if st.button("📦 Export All Guides"):
+                    progress = st.progress(0.0, text="Rendering resolution guides...")
+                    previous_export = st.session_state.pop('guide_export_path', None)
+                    if previous_export and os.path.exists(previous_export):
+                        os.remove(previous_export)
+                    # Stream into a temp file so the archive is never assembled in memory
+                    export_file = _new_export_file()
+                    try:
+                        with export_file:
+                            _, skipped = llm_utils.export_resolution_guides(
+                                store.iter_guide_records(selected_groups), export_file, total=processed_total,
+                                progress_callback=lambda done, total: progress.progress(
+                                    min(done / total, 1.0), text=f"Rendered {done}/{total} guides"
+                                ),
+                            )
+                    except Exception as e:
+                        # Do not leave a half-written archive behind
+                        os.remove(export_file.name)
+                        st.error(f"Export failed: {e}")
+                    else:
+                        st.session_state['guide_export_path'] = export_file.name
+                        if skipped:
+                            st.warning(f"{len(skipped)} guide(s) could not be rendered and were left out: "
+                                       + ", ".join(sorted(skipped)[:10]) + ("..." if len(skipped) > 10 else ""))
+
+            export_path = st.session_state.get('guide_export_path')
+            if export_path and os.path.exists(export_path):
+                with open(export_path, "rb") as export_data:
+                    st.download_button(
+                        label="⬇️ Download Guides ZIP",
+                        data=export_data,
+                        file_name="Resolution_Guides.zip",
+                        mime="application/zip"
+                    )
     else:
-        st.info("No incidents found. Use the simulation trigger above to generate some.")
+        if any(table_filter.values()):
+            st.info("No incidents match the current filters.")
+        else:
+            st.info("No incidents found. Use the simulation trigger above to generate some.")
 
     # ------------------------------------------------------------------
-    # Timer & Rerun Logic (Placed at end to ensure UI renders first)
+    # Copilot: replies stream in chunk by chunk
     # ------------------------------------------------------------------
-    # Logic moved to top of script
-    if needs_timer_rerun:
-        time.sleep(1)
-        st.rerun()
+    st.subheader("💬 Copilot")
+    chat_history = st.session_state.setdefault('chat_history', [])
+    for message in chat_history:
+        with st.chat_message(message['role']):
+            st.markdown(message['content'])
+    question = st.chat_input("Ask Agent Tina about the incidents...")
+    if question:
+        chat_history.append({'role': 'user', 'content': question})
+        with st.chat_message('user'):
+            st.markdown(question)
+        with st.chat_message('assistant'):
+            answer = st.write_stream(llm_utils.stream_incident_bot(question))
+        chat_history.append({'role': 'assistant', 'content': answer if isinstance(answer, str) else "".join(map(str, answer))})
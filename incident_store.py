@@ -0,0 +1,410 @@
+"""
+SQLite-backed incident repository for Agent Tina.
+
+Replaces the per-session `incidents_df` DataFrame: incidents survive restarts, are
+visible to every operator session of the server, and the dashboard only loads the
+page it shows. One store per process (see get_incident_store), opened in WAL mode:
+writes are serialized on one connection, while every thread reads through its own
+connection, so readers never block the background workers writing results (or wait
+for them).
+"""
+import os
+import sqlite3
+import threading
+from collections import deque
+import pandas as pd
+import streamlit as st
+
+INCIDENT_DB_PATH = os.getenv("TINA_INCIDENT_DB", "incidents.db")
+
+TICKET_PREFIX = "INC"
+# Numbering starts above the range of the old random INC10000-INC99999 ids
+TICKET_ID_START = 100000
+
+CHANGE_LOG_SIZE = 1000  # write batches remembered for changes_since()
+
+# DataFrame column -> SQLite column (display order)
+COLUMNS = {
+    'TicketID': 'ticket_id',
+    'Description': 'description',
+    'CI Type': 'ci_type',
+    'CI Name': 'ci_name',
+    'Manufacturer': 'manufacturer',
+    'Priority': 'priority',
+    'Status': 'status',
+    'Assignment Group': 'assignment_group',
+    'Assigned To': 'assigned_to',
+    'Notes': 'notes',
+    'Recommendation': 'recommendation',
+    'Recommendation Source': 'recommendation_source',
+    'Created At': 'created_at',
+    'Parent ID': 'parent_id',
+}
+
+# Low-cardinality columns held as pandas categoricals in memory: a small integer code per
+# row plus one lookup table of the distinct values, instead of a Python string per cell
+CATEGORY_COLUMNS = ('CI Type', 'Manufacturer', 'Priority', 'Status', 'Assignment Group', 'Recommendation Source')
+
+# Dashboard sort options -> ORDER BY (id breaks ties so pages stay stable)
+SORT_ORDERS = {
+    'Oldest first': 'id',
+    'Newest first': 'id DESC',
+    'Priority': "CASE priority WHEN 'Critical' THEN 0 WHEN 'High' THEN 1 WHEN 'Low' THEN 3 ELSE 2 END, id",
+    'Status': 'status, id',
+    'Assignment Group': 'assignment_group, id',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS incidents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket_id TEXT NOT NULL,
+    description TEXT,
+    ci_type TEXT,
+    ci_name TEXT,
+    manufacturer TEXT,
+    priority TEXT,
+    status TEXT,
+    assignment_group TEXT,
+    assigned_to TEXT,
+    notes TEXT,
+    recommendation TEXT,
+    recommendation_source TEXT,
+    created_at TEXT,
+    parent_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_incidents_status ON incidents (status);
+CREATE INDEX IF NOT EXISTS idx_incidents_group ON incidents (assignment_group);
+CREATE INDEX IF NOT EXISTS idx_incidents_priority ON incidents (priority);
+CREATE INDEX IF NOT EXISTS idx_incidents_ticket ON incidents (ticket_id);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+def format_ticket_id(number):
+    return f"{TICKET_PREFIX}{int(number)}"
+
+def compact_incidents(df):
+    """Converts the CATEGORY_COLUMNS present in an incident frame to categoricals."""
+    columns = {col: 'category' for col in CATEGORY_COLUMNS
+               if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype)}
+    return df.astype(columns) if columns else df
+
+def map_values(col, mapping, default=None):
+    """
+    col.map(mapping) with `default` for unmapped values. On a categorical column only
+    the distinct values are looked up and the result is gathered by code.
+    """
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        table = [mapping.get(value, default) for value in col.cat.categories] + [default]  # code -1 = missing
+        values = pd.array(table, dtype=object)[col.cat.codes.to_numpy()]
+        return pd.Series(values, index=col.index, name=col.name, dtype=object)
+    return col.map(lambda value: mapping.get(value, default))
+
+class IncidentStore:
+    """
+    Thin repository over the `incidents` table. Rows are addressed by their integer
+    `id`, which is also the index of every DataFrame this class returns.
+    """
+    def __init__(self, db_path=INCIDENT_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.RLock()  # guards writes and the in-memory state below
+        self._local = threading.local()  # per-thread read connection
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._migrate()
+        self._init_ticket_counter()
+        # Write counter plus the row ids of recent writes, so caches and indexes can follow incrementally
+        self.version = 0
+        self._change_log = deque(maxlen=CHANGE_LOG_SIZE)  # (version, row ids or None for "everything")
+        # TicketID -> row id, so ticket lookups never scan the table
+        with self._lock:
+            self._ticket_index = dict(self._conn.execute("SELECT ticket_id, id FROM incidents ORDER BY id"))
+
+    def _migrate(self):
+        """Brings databases created by older versions up to the current schema."""
+        with self._lock, self._conn:
+            existing = {row[1] for row in self._conn.execute("PRAGMA table_info(incidents)")}
+            if 'parent_id' not in existing:
+                self._conn.execute("ALTER TABLE incidents ADD COLUMN parent_id INTEGER")
+            if 'recommendation_source' not in existing:
+                self._conn.execute("ALTER TABLE incidents ADD COLUMN recommendation_source TEXT")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_incidents_parent ON incidents (parent_id)")
+
+    # ------------------------------------------------------------------
+    # Ticket ids
+    # ------------------------------------------------------------------
+    def _init_ticket_counter(self):
+        """Seeds the high-water mark once, above any ticket number already stored."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO counters (name, value) "
+                "SELECT 'ticket_id', MAX(?, COALESCE(MAX(CAST(SUBSTR(ticket_id, ?) AS INTEGER)), 0)) FROM incidents",
+                (TICKET_ID_START, len(TICKET_PREFIX) + 1),
+            )
+
+    def allocate_ticket_numbers(self, count):
+        """
+        Reserves `count` consecutive ticket numbers and returns them as a range. The
+        high-water mark is bumped atomically in the database, so blocks never overlap
+        across threads, sessions or restarts.
+        """
+        count = int(count)
+        with self._lock, self._conn:
+            high = self._conn.execute(
+                "UPDATE counters SET value = value + ? WHERE name = 'ticket_id' RETURNING value", (count,)
+            ).fetchone()[0]
+        return range(high - count + 1, high + 1)
+
+    def allocate_ticket_ids(self, count):
+        return [format_ticket_id(n) for n in self.allocate_ticket_numbers(count)]
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+    def insert_incidents(self, df):
+        """Appends the rows of an incidents DataFrame; returns the new row ids."""
+        columns = [c for c in COLUMNS if c in df.columns]
+        sql = (f"INSERT INTO incidents ({', '.join(COLUMNS[c] for c in columns)}) "
+               f"VALUES ({', '.join('?' for _ in columns)})")
+        records = df[columns].astype(object).where(df[columns].notna(), None).itertuples(index=False, name=None)
+        with self._lock, self._conn:
+            self._conn.executemany(sql, records)
+            # AUTOINCREMENT ids of one transaction are contiguous and end at the sequence value
+            last_id = self._conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'incidents'").fetchone()[0]
+            row_ids = list(range(last_id - len(df) + 1, last_id + 1))
+            if 'TicketID' in df.columns:
+                self._ticket_index.update(zip(df['TicketID'], row_ids))
+            self._record(range(row_ids[0], row_ids[-1] + 1) if row_ids else [])
+        return row_ids
+
+    def update_incidents(self, updates_by_id, child_updates=None):
+        """
+        Applies {row id: {DataFrame column: value}} as primary-key updates in one transaction.
+        `child_updates` ({DataFrame column: value}), if given, is applied in the same
+        transaction to every incident correlated to one of those rows.
+        """
+        with self._lock, self._conn:
+            changed = [int(row_id) for row_id in updates_by_id]
+            for row_id, updates in updates_by_id.items():
+                columns = [c for c in updates if c in COLUMNS]
+                if not columns:
+                    continue
+                self._conn.execute(
+                    f"UPDATE incidents SET {', '.join(f'{COLUMNS[c]} = ?' for c in columns)} WHERE id = ?",
+                    [updates[c] for c in columns] + [int(row_id)],
+                )
+                if child_updates:
+                    changed += self._update_children(row_id, child_updates)
+            self._record(changed)
+
+    def link_children(self, updates_by_id, inherit=(), closed_statuses=()):
+        """
+        Applies {row id: {DataFrame column: value}} (which set 'Parent ID') and then, in the
+        same transaction, copies the `inherit` columns from every parent that has left
+        'Assigned'; a child of a parent in `closed_statuses` also takes the parent's status.
+        The parent is read under the write lock, so a parent finished concurrently (whose
+        update_children ran just before) is never missed.
+        """
+        inherit = [c for c in inherit if c in COLUMNS]
+        copy = [f"{COLUMNS[c]} = CASE WHEN parent.status != 'Assigned' THEN parent.{COLUMNS[c]} "
+                f"ELSE incidents.{COLUMNS[c]} END" for c in inherit]
+        if closed_statuses:
+            copy.append(f"status = CASE WHEN parent.status IN ({', '.join('?' for _ in closed_statuses)}) "
+                        f"THEN parent.status ELSE incidents.status END")
+        with self._lock, self._conn:
+            for row_id, updates in updates_by_id.items():
+                columns = [c for c in updates if c in COLUMNS]
+                self._conn.execute(
+                    f"UPDATE incidents SET {', '.join(f'{COLUMNS[c]} = ?' for c in columns)} WHERE id = ?",
+                    [updates[c] for c in columns] + [int(row_id)],
+                )
+                if copy:
+                    self._conn.execute(
+                        f"UPDATE incidents SET {', '.join(copy)} FROM incidents AS parent "
+                        f"WHERE incidents.id = ? AND parent.id = incidents.parent_id",
+                        list(closed_statuses) + [int(row_id)],
+                    )
+            self._record([int(row_id) for row_id in updates_by_id])
+
+    def update_children(self, parent_id, updates):
+        """Copies {DataFrame column: value} onto every incident correlated to `parent_id`."""
+        with self._lock, self._conn:
+            changed = self._update_children(parent_id, updates)
+            if changed:
+                self._record(changed)
+
+    def _update_children(self, parent_id, updates):
+        # Caller holds self._lock and the transaction; returns the child row ids written
+        columns = [c for c in updates if c in COLUMNS]
+        if not columns:
+            return []
+        return [row[0] for row in self._conn.execute(
+            f"UPDATE incidents SET {', '.join(f'{COLUMNS[c]} = ?' for c in columns)} WHERE parent_id = ? RETURNING id",
+            [updates[c] for c in columns] + [int(parent_id)],
+        ).fetchall()]
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM incidents")
+            self._ticket_index.clear()
+            self._record(None)
+
+    def _record(self, row_ids):
+        # Caller holds self._lock
+        self.version += 1
+        self._change_log.append((self.version, row_ids))
+
+    def changes_since(self, version):
+        """
+        (row ids written after `version`, current version). The ids are None when the
+        caller has to reload everything: the table was cleared, the version is older
+        than the change log, or it is -1 (nothing loaded yet).
+        """
+        with self._lock:
+            if version == self.version:
+                return [], version
+            if version < 0 or not self._change_log or self._change_log[0][0] > version + 1:
+                return None, self.version
+            row_ids = set()
+            for logged_version, ids in reversed(self._change_log):
+                if logged_version <= version:
+                    break
+                if ids is None:
+                    return None, self.version
+                row_ids.update(ids)
+            return sorted(row_ids), self.version
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+    def _reader(self):
+        """This thread's read-only connection; each query sees the latest committed state."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.db_path)
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def _frame(self, where="", params=(), order_by="id", limit=None, offset=0):
+        select = ", ".join(f'{col} AS "{name}"' for name, col in COLUMNS.items())
+        sql = f"SELECT id, {select} FROM incidents {where} ORDER BY {order_by}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)} OFFSET {int(offset)}"
+        df = pd.read_sql_query(sql, self._reader(), params=list(params), index_col='id')
+        return compact_incidents(df)
+
+    @staticmethod
+    def _filter(groups=None, statuses=None, priorities=None, search=None):
+        """WHERE clause for the dashboard filters; every filter is optional, they combine with AND."""
+        clauses, params = [], []
+        for col, values in (('assignment_group', groups), ('status', statuses), ('priority', priorities)):
+            if values:
+                clauses.append(f"{col} IN ({', '.join('?' for _ in values)})")
+                params.extend(values)
+        if search:
+            clauses.append("(ticket_id LIKE ? OR description LIKE ?)")
+            params += [f"%{search}%"] * 2
+        return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+    def fetch(self, row_ids):
+        """Rows by id (any order) as a DataFrame indexed by id."""
+        row_ids = [int(i) for i in row_ids]
+        if not row_ids:
+            return self._frame("WHERE 0")
+        return self._frame(f"WHERE id IN ({', '.join('?' for _ in row_ids)})", row_ids)
+
+    def row_id_for_ticket(self, ticket_id):
+        return self._ticket_index.get(ticket_id)
+
+    def get_by_ticket(self, ticket_id):
+        """The incident with this TicketID as a Series, or None."""
+        row_id = self._ticket_index.get(ticket_id)
+        if row_id is None:
+            return None
+        df = self.fetch([row_id])
+        return None if df.empty else df.iloc[0]
+
+    def query_page(self, groups=None, limit=50, offset=0, statuses=None, priorities=None, search=None,
+                   sort='Oldest first'):
+        """One page of incidents, filtered and sorted (see SORT_ORDERS) in SQL before slicing."""
+        where, params = self._filter(groups, statuses, priorities, search)
+        return self._frame(where, params, order_by=SORT_ORDERS.get(sort, 'id'), limit=limit, offset=offset)
+
+    def count(self, groups=None, statuses=None, priorities=None, search=None):
+        where, params = self._filter(groups, statuses, priorities, search)
+        return self._reader().execute(f"SELECT COUNT(*) FROM incidents {where}", params).fetchone()[0]
+
+    def count_processed(self, groups=None):
+        """Tickets that already have a recommendation (i.e. a resolution guide)."""
+        where, params = self._filter(groups)
+        where = f"{where} AND" if where else "WHERE"
+        sql = f"SELECT COUNT(*) FROM incidents {where} recommendation != 'Pending Analysis...'"
+        return self._reader().execute(sql, params).fetchone()[0]
+
+    def iter_guide_records(self, groups=None, chunk_size=500):
+        """Streams (ticket_id, description, recommendation, manufacturer) of processed tickets in id order."""
+        where, params = self._filter(groups)
+        where = f"{where} AND" if where else "WHERE"
+        last_id = 0
+        while True:
+            sql = (f"SELECT id, ticket_id, description, recommendation, manufacturer FROM incidents "
+                   f"{where} recommendation != 'Pending Analysis...' AND id > ? ORDER BY id LIMIT {int(chunk_size)}")
+            rows = self._reader().execute(sql, params + [last_id]).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row[1:]
+            last_id = rows[-1][0]
+
+    def open_ticket_counts(self, statuses=('In Progress',)):
+        """{assignee: number of tickets in one of `statuses`}."""
+        sql = (f"SELECT assigned_to, COUNT(*) FROM incidents WHERE status IN ({', '.join('?' for _ in statuses)}) "
+               f"GROUP BY assigned_to")
+        return dict(self._reader().execute(sql, list(statuses)).fetchall())
+
+    def status_counts(self):
+        """{status: tickets} over the whole store."""
+        return dict(self._reader().execute("SELECT status, COUNT(*) FROM incidents GROUP BY status").fetchall())
+
+    def iter_frames(self, chunk_size=5000):
+        """Every incident as a sequence of DataFrames of at most `chunk_size` rows, in id order."""
+        last_id = 0
+        while True:
+            df = self._frame("WHERE id > ?", [last_id], limit=chunk_size)
+            if df.empty:
+                return
+            yield df
+            last_id = int(df.index[-1])
+
+    def pending_since(self, after_id=0, up_to_id=None):
+        """(id, priority, created_at) of pending tickets with after_id < id <= up_to_id, in id order."""
+        sql = "SELECT id, priority, created_at FROM incidents WHERE status = 'Assigned' AND id > ?"
+        params = [int(after_id)]
+        if up_to_id is not None:
+            sql += " AND id <= ?"
+            params.append(int(up_to_id))
+        return self._reader().execute(sql + " ORDER BY id", params).fetchall()
+
+    def pending_frame(self, after_id=0):
+        """Pending tickets with id > after_id as a DataFrame, in id order."""
+        return self._frame("WHERE status = 'Assigned' AND id > ?", [int(after_id)])
+
+    def pending_ids(self, limit=None, exclude=()):
+        """Ids of tickets still waiting for assignment, oldest first."""
+        sql = "SELECT id FROM incidents WHERE status = 'Assigned' ORDER BY id"
+        if limit:
+            sql += f" LIMIT {int(limit) + len(exclude)}"
+        ids = [row[0] for row in self._reader().execute(sql)]
+        if exclude:
+            ids = [i for i in ids if i not in exclude]
+        return ids[:limit] if limit else ids
+
+@st.cache_resource
+def get_incident_store():
+    """The process-wide incident store shared by every session and worker thread."""
+    return IncidentStore()
@@ -1,146 +1,183 @@
 import streamlit as st
 import streamlit.components.v1 as components
 import pandas as pd
+import os
+import re
 import random
+import threading
+import numpy as np
 import time
 from datetime import datetime
 import roster
 import llm_utils
+import incident_store
+import scheduler
+import retrieval
 
-def generate_realistic_scenario(group):
-    scenarios = {
-        "Windows": [("Blue Screen of Death (BSOD) reported", "Server"), ("Active Directory Login Failure", "Service"), ("Print Spooler Service Stuck", "Service"), ("C: Drive Disk Space Low", "Server")],
-        "Unix": [("Kernel Panic on Production Node", "Server"), ("SSH Daemon failed to start", "Service"), ("Inode usage 100% on /var", "Server"), ("Zombie processes count high", "Server")],
-        "Storage": [("SAN Multipath Flapping", "Hardware"), ("NAS Volume Read-Only", "Hardware"), ("LUN Latency High > 20ms", "Hardware"), ("RAID Battery Failure Warning", "Hardware")],
-        "Backup": [("NetBackup Job Failed: Error 96", "Service"), ("Tape Library Robot Arm Stuck", "Hardware"), ("Snapshot Deletion Failed", "Service"), ("Retention Policy not Applied", "Service")],
-        "Network": [("Switch Port Flapping", "Network Device"), ("Packet Loss on Uplink", "Network Device"), ("VPN Tunnel Down", "Service"), ("BGP Neighborship Down", "Network Device")],
-        "Firewall": [("Palo Alto HA Sync Down", "Network Device"), ("Rule 45 blocking valid traffic", "Configuration"), ("VPN User Unable to Connect", "Service"), ("Firewall Throughput Spiking", "Network Device")],
-        "Tools": [("JIRA Slow Response Time", "Application"), ("GitLab Runner Offline", "Application"), ("Jenkins Build Queue Stuck", "Application"), ("ServiceNow API Timeout", "Application")],
-        "Database": [("Oracle Tablespace Full", "Database"), ("SQL Server Deadlock Detected", "Database"), ("MySQL Replication Lag High", "Database"), ("Postgres Connection Pool Exhausted", "Database")],
-        "Cloud": [("AWS EC2 Instance Status Check Failed", "Cloud Resource"), ("Azure VM Allocation Failed", "Cloud Resource"), ("S3 Bucket Access Denied", "Cloud Resource"), ("Kubernetes Pod Loop Crash", "Cloud Resource")]
+# ----------------------------------------------------------------------
+# Scenario tables (built once at import)
+# ----------------------------------------------------------------------
+SCENARIOS = {
+    "Windows": [("Blue Screen of Death (BSOD) reported", "Server"), ("Active Directory Login Failure", "Service"), ("Print Spooler Service Stuck", "Service"), ("C: Drive Disk Space Low", "Server")],
+    "Unix": [("Kernel Panic on Production Node", "Server"), ("SSH Daemon failed to start", "Service"), ("Inode usage 100% on /var", "Server"), ("Zombie processes count high", "Server")],
+    "Storage": [("SAN Multipath Flapping", "Hardware"), ("NAS Volume Read-Only", "Hardware"), ("LUN Latency High > 20ms", "Hardware"), ("RAID Battery Failure Warning", "Hardware")],
+    "Backup": [("NetBackup Job Failed: Error 96", "Service"), ("Tape Library Robot Arm Stuck", "Hardware"), ("Snapshot Deletion Failed", "Service"), ("Retention Policy not Applied", "Service")],
+    "Network": [("Switch Port Flapping", "Network Device"), ("Packet Loss on Uplink", "Network Device"), ("VPN Tunnel Down", "Service"), ("BGP Neighborship Down", "Network Device")],
+    "Firewall": [("Palo Alto HA Sync Down", "Network Device"), ("Rule 45 blocking valid traffic", "Configuration"), ("VPN User Unable to Connect", "Service"), ("Firewall Throughput Spiking", "Network Device")],
+    "Tools": [("JIRA Slow Response Time", "Application"), ("GitLab Runner Offline", "Application"), ("Jenkins Build Queue Stuck", "Application"), ("ServiceNow API Timeout", "Application")],
+    "Database": [("Oracle Tablespace Full", "Database"), ("SQL Server Deadlock Detected", "Database"), ("MySQL Replication Lag High", "Database"), ("Postgres Connection Pool Exhausted", "Database")],
+    "Cloud": [("AWS EC2 Instance Status Check Failed", "Cloud Resource"), ("Azure VM Allocation Failed", "Cloud Resource"), ("S3 Bucket Access Denied", "Cloud Resource"), ("Kubernetes Pod Loop Crash", "Cloud Resource")]
+}
+
+DEFAULT_SCENARIOS = [("General System Error", "Server"), ("Performance Degradation", "Application")]
+
+# Detailed Manufacturer Mapping (User Provided)
+# Mapping: Group -> Category (CI Type) -> [Manufacturers]
+MANUFACTURER_MAPPING = {
+    'Windows': {
+        'Server': ['Dell', 'HPE', 'Lenovo', 'Fujitsu', 'Cisco'],
+        'Virtualization': ['VMware', 'Microsoft', 'Citrix', 'Red Hat', 'Nutanix'],
+        'Service': ['Microsoft'] # Fallback
+    },
+    'Unix': {
+        'Server': ['IBM', 'Oracle', 'HPE', 'Dell', 'Fujitsu'],
+        'UNIX Platforms': ['Oracle', 'IBM', 'HPE', 'Hitachi', 'Bull']
+    },
+    'Storage': {
+        'Hardware': ['NetApp', 'Dell EMC', 'HPE', 'IBM', 'Hitachi Vantara'], # SAN/NAS
+        'Object Storage': ['Pure Storage', 'Scality', 'MinIO', 'Cloudian', 'Huawei']
+    },
+    'Backup': {
+        'Hardware': ['Dell EMC', 'HPE', 'IBM', 'Quantum', 'ExaGrid'], # Appliances
+        'Service': ['Veritas', 'Veeam', 'Commvault', 'Rubrik', 'Cohesity'] # Software
+    },
+    'Network': {
+        'Network Device': ['Cisco', 'Juniper', 'Arista', 'HPE Aruba', 'Extreme Networks'], # Switching
+        'Routing': ['Cisco', 'Juniper', 'Nokia', 'Huawei', 'MikroTik']
+    },
+    'Firewall': {
+        'Network Device': ['Palo Alto Networks', 'Fortinet', 'Check Point', 'Cisco', 'Sophos'], # Appliances
+        'Configuration': ['Palo Alto Networks', 'Fortinet'],
+        'Service': ['Zscaler', 'Akamai', 'Cloudflare', 'Forcepoint', 'McAfee'] # Secure Access
+    },
+    'Database': {
+        'Database': ['Oracle', 'Microsoft', 'IBM', 'SAP', 'MongoDB'], # Platforms
+        'Hardware': ['Oracle', 'Dell', 'HPE', 'IBM', 'Fujitsu'] # DB Hardware
+    },
+    'Tools': {
+        'Application': ['SolarWinds', 'Dynatrace', 'Datadog', 'Nagios', 'Zabbix'], # Monitoring
+        'Automation': ['ServiceNow', 'BMC', 'Ansible', 'Terraform', 'Puppet']
+    },
+    'Cloud': {
+        'Cloud Resource': ['AWS', 'Microsoft Azure', 'Google Cloud', 'Oracle Cloud', 'IBM Cloud'], # Providers
+        'Hardware': ['Dell', 'HPE', 'Cisco', 'Supermicro', 'Lenovo']
     }
-    
-    defaults = [("General System Error", "Server"), ("Performance Degradation", "Application")]
-    options = scenarios.get(group, defaults)
-    return random.choice(options)
+}
 
-def trigger_incidents(count, source_type="Event", target_group="Random"):
-    
-    assignment_groups = llm_utils.ASSIGNMENT_GROUPS
-    
-    # Detailed Manufacturer Mapping (User Provided)
-    # Mapping: Group -> Category (CI Type) -> [Manufacturers]
-    manufacturer_mapping = {
-        'Windows': {
-            'Server': ['Dell', 'HPE', 'Lenovo', 'Fujitsu', 'Cisco'],
-            'Virtualization': ['VMware', 'Microsoft', 'Citrix', 'Red Hat', 'Nutanix'],
-            'Service': ['Microsoft'] # Fallback
-        },
-        'Unix': {
-            'Server': ['IBM', 'Oracle', 'HPE', 'Dell', 'Fujitsu'],
-            'UNIX Platforms': ['Oracle', 'IBM', 'HPE', 'Hitachi', 'Bull']
-        },
-        'Storage': {
-            'Hardware': ['NetApp', 'Dell EMC', 'HPE', 'IBM', 'Hitachi Vantara'], # SAN/NAS
-            'Object Storage': ['Pure Storage', 'Scality', 'MinIO', 'Cloudian', 'Huawei']
-        },
-        'Backup': {
-            'Hardware': ['Dell EMC', 'HPE', 'IBM', 'Quantum', 'ExaGrid'], # Appliances
-            'Service': ['Veritas', 'Veeam', 'Commvault', 'Rubrik', 'Cohesity'] # Software
-        },
-        'Network': {
-            'Network Device': ['Cisco', 'Juniper', 'Arista', 'HPE Aruba', 'Extreme Networks'], # Switching
-            'Routing': ['Cisco', 'Juniper', 'Nokia', 'Huawei', 'MikroTik']
-        },
-        'Firewall': {
-            'Network Device': ['Palo Alto Networks', 'Fortinet', 'Check Point', 'Cisco', 'Sophos'], # Appliances
-            'Configuration': ['Palo Alto Networks', 'Fortinet'],
-            'Service': ['Zscaler', 'Akamai', 'Cloudflare', 'Forcepoint', 'McAfee'] # Secure Access
-        },
-        'Database': {
-            'Database': ['Oracle', 'Microsoft', 'IBM', 'SAP', 'MongoDB'], # Platforms
-            'Hardware': ['Oracle', 'Dell', 'HPE', 'IBM', 'Fujitsu'] # DB Hardware
-        },
-        'Tools': {
-            'Application': ['SolarWinds', 'Dynatrace', 'Datadog', 'Nagios', 'Zabbix'], # Monitoring
-            'Automation': ['ServiceNow', 'BMC', 'Ansible', 'Terraform', 'Puppet']
-        },
-        'Cloud': {
-            'Cloud Resource': ['AWS', 'Microsoft Azure', 'Google Cloud', 'Oracle Cloud', 'IBM Cloud'], # Providers
-            'Hardware': ['Dell', 'HPE', 'Cisco', 'Supermicro', 'Lenovo']
-        }
+PRIORITIES = ['Critical', 'High', 'Medium', 'Low']
+
+# Upper bound for one "Generate Incidents" click (load tests go well past the old 20)
+MAX_GENERATED_INCIDENTS = int(os.getenv("TINA_MAX_GENERATED_INCIDENTS", "200000"))
+
+def generate_realistic_scenario(group):
+    return random.choice(SCENARIOS.get(group, DEFAULT_SCENARIOS))
+
+def manufacturers_for(group, ci_type):
+    """Manufacturer candidates for a Group / CI Type pair."""
+    group_map = MANUFACTURER_MAPPING.get(group, {})
+    # Try exact match, then 'Server' or 'Hardware' fallbacks, then generic
+    mfg_list = group_map.get(ci_type)
+    if not mfg_list:
+        if 'Server' in group_map: mfg_list = group_map['Server']
+        elif 'Hardware' in group_map: mfg_list = group_map['Hardware']
+        else: mfg_list = ['Generic', 'Unknown']
+    return mfg_list
+
+def _scenario_table(groups):
+    """
+    Flattens the scenario/manufacturer tables for `groups` into NumPy arrays so a whole
+    batch can be sampled with a handful of vectorized index operations:
+    group -> slice of scenario rows -> slice of manufacturer rows.
+    """
+    scen_start, scen_count = [], []
+    scen_desc, scen_ci_type, mfg_start, mfg_count = [], [], [], []
+    mfg_name, mfg_ci_prefix = [], []
+    for group in groups:
+        options = SCENARIOS.get(group, DEFAULT_SCENARIOS)
+        scen_start.append(len(scen_desc))
+        scen_count.append(len(options))
+        for desc, ci_type in options:
+            mfg_list = manufacturers_for(group, ci_type)
+            scen_desc.append(desc)
+            scen_ci_type.append(ci_type)
+            mfg_start.append(len(mfg_name))
+            mfg_count.append(len(mfg_list))
+            for manufacturer in mfg_list:
+                mfg_name.append(manufacturer)
+                mfg_ci_prefix.append(f"{ci_type[:3]}-{manufacturer[:3]}-".upper())
+    return {
+        'groups': np.array(groups, dtype=object),
+        'scen_start': np.array(scen_start), 'scen_count': np.array(scen_count),
+        'desc': np.array(scen_desc, dtype=object), 'ci_type': np.array(scen_ci_type, dtype=object),
+        'mfg_start': np.array(mfg_start), 'mfg_count': np.array(mfg_count),
+        'manufacturer': np.array(mfg_name, dtype=object), 'ci_prefix': np.array(mfg_ci_prefix, dtype=object),
     }
-    
-    priorities = ['Critical', 'High', 'Medium', 'Low']
-    
-    new_incidents = []
-    
-    for _ in range(count):
-        # 1. Determine Group
-        if target_group and target_group != "Random":
-            group = target_group
-        else:
-            group = random.choice(assignment_groups)
-            
-        # 2. Get Attributes
-        desc, ci_type = generate_realistic_scenario(group)
-        priority = random.choice(priorities)
-        
-        # Add Prefix
-        if source_type == "Event":
-             desc = f"[Alert] {desc}"
-        else:
-             desc = f"User Reported: {desc}"
-             
-        # 3. Generate CI Name & Manufacturer
-        # Get specific manufacturer list for this Group and CI Type
-        group_map = manufacturer_mapping.get(group, {})
-        # Try exact match, then 'Server' or 'Hardware' fallbacks, then generic
-        mfg_list = group_map.get(ci_type)
-        if not mfg_list:
-            # Fallback logic if specific CI Type key isn't found
-            if 'Server' in group_map: mfg_list = group_map['Server']
-            elif 'Hardware' in group_map: mfg_list = group_map['Hardware']
-            else: mfg_list = ['Generic', 'Unknown']
-            
-        manufacturer = random.choice(mfg_list)
-        
-        # Random CI Name
-        alphanum = ''.join(random.choices('0123456789', k=3))
-        # Handle case where ci_type might be shorter than 3 chars (unlikely but safe)
-        ci_prefix = ci_type[:3].lower() if len(ci_type) >=3 else ci_type.lower()
-        ci_name = f"{ci_prefix}-{manufacturer[:3].lower()}-{alphanum}".upper()
-        
-        new_incidents.append({
-            'TicketID': f"INC{random.randint(10000, 99999)}",
-            'Description': desc,
-            'CI Type': ci_type,
-            'CI Name': ci_name,
-            'Manufacturer': manufacturer,
-            'Priority': priority,
-            'Status': 'Assigned',
-            'Assignment Group': group,
-            'Assigned To': 'Unassigned',
-            'Notes': '',
-            'Recommendation': 'Pending Analysis...',
-            'Created At': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        })
-    
 
-    
-    new_df = pd.DataFrame(new_incidents)
-    
-    if 'incidents_df' in st.session_state:
-        # Ensure new columns exist in old dataframe if it exists
-        if 'Priority' not in st.session_state['incidents_df'].columns:
-             st.session_state['incidents_df']['Priority'] = "Medium"
-        if 'CI Type' not in st.session_state['incidents_df'].columns:
-             st.session_state['incidents_df']['CI Type'] = "Unknown"
-             
-        st.session_state['incidents_df'] = pd.concat([st.session_state['incidents_df'], new_df], ignore_index=True)
+_SCENARIO_TABLE = _scenario_table(llm_utils.ASSIGNMENT_GROUPS)
+
+def generate_incident_frame(count, source_type="Event", target_group="Random", seed=None, as_arrow=False,
+                            ticket_numbers=None):
+    """
+    Bulk incident generator for load testing: samples group, scenario, priority,
+    manufacturer and CI name for all `count` rows at once with NumPy and returns a
+    DataFrame in the incident-store layout, low-cardinality columns as categoricals
+    (or a pyarrow Table with `as_arrow`, where they become dictionary arrays).
+    The same `seed` always yields the same incidents.
+
+    TicketIDs come from `ticket_numbers` (a block from the store's allocator); when
+    omitted a block is reserved from the shared incident store.
+    """
+    if ticket_numbers is None:
+        ticket_numbers = incident_store.get_incident_store().allocate_ticket_numbers(count)
+    rng = np.random.default_rng(seed)
+    if target_group and target_group != "Random":
+        table = _SCENARIO_TABLE if target_group in llm_utils.ASSIGNMENT_GROUPS else _scenario_table([target_group])
+        group_idx = np.full(count, list(table['groups']).index(target_group))
     else:
-        st.session_state['incidents_df'] = new_df
-        
+        table = _SCENARIO_TABLE
+        group_idx = rng.integers(len(table['groups']), size=count)
+
+    # Uniform pick inside each row's slice: start + floor(u * size)
+    scen_idx = table['scen_start'][group_idx] + (rng.random(count) * table['scen_count'][group_idx]).astype(np.int64)
+    mfg_idx = table['mfg_start'][scen_idx] + (rng.random(count) * table['mfg_count'][scen_idx]).astype(np.int64)
+
+    prefix = "[Alert] " if source_type == "Event" else "User Reported: "
+    alphanum = pd.Series(rng.integers(0, 1000, size=count)).astype(str).str.zfill(3)
+
+    df = pd.DataFrame({
+        'TicketID': incident_store.TICKET_PREFIX + pd.Series(np.asarray(ticket_numbers)).astype(str),
+        'Description': prefix + pd.Series(table['desc'][scen_idx]),
+        'CI Type': table['ci_type'][scen_idx],
+        'CI Name': pd.Series(table['ci_prefix'][mfg_idx]) + alphanum,
+        'Manufacturer': table['manufacturer'][mfg_idx],
+        'Priority': pd.Categorical.from_codes(rng.integers(len(PRIORITIES), size=count), PRIORITIES),
+        'Status': 'Assigned',
+        'Assignment Group': pd.Categorical.from_codes(group_idx, table['groups']),
+        'Assigned To': 'Unassigned',
+        'Notes': '',
+        'Recommendation': 'Pending Analysis...',
+        'Created At': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    })
+    df = incident_store.compact_incidents(df)
+    if as_arrow:
+        import pyarrow as pa
+        return pa.Table.from_pandas(df, preserve_index=False)
+    return df
+
+def trigger_incidents(count, source_type="Event", target_group="Random", seed=None):
+    new_df = generate_incident_frame(count, source_type=source_type, target_group=target_group, seed=seed)
+    incident_store.get_incident_store().insert_incidents(new_df)
+
     st.success(f"Generated {count} new incidents from {source_type} targeting {target_group}!")
     
     # Simulate the "Wait 2 minutes" requirement immediately after generation for the flow
@@ -148,59 +185,160 @@ def trigger_incidents(count, source_type="Event", target_group="Random"):
     # The requirement says "Once generated wait 2 minutes", then check.
     # We will implement this in the process_tickets function as a visual delay.
 
-def process_tickets():
+# ----------------------------------------------------------------------
+# Alert storm correlation (runs before processing)
+# ----------------------------------------------------------------------
+CORRELATION_WINDOW_SECONDS = float(os.getenv("TINA_CORRELATION_WINDOW", "600"))
+CORRELATED_STATUS = 'Correlated'
+CLOSED_STATUSES = ('Resolved', 'Processing Failed')  # a new alert after these opens a new incident
+INHERITED_COLUMNS = ('Assigned To', 'Recommendation', 'Recommendation Source')  # parent -> correlated children
+ALERT_PREFIX = "[alert] "
+
+def normalize_alert(description):
+    """Correlation form of an alert description: case, numbers and spacing do not matter."""
+    text = str(description).lower()
+    if text.startswith(ALERT_PREFIX):
+        text = text[len(ALERT_PREFIX):]
+    text = re.sub(r"\d+", "#", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+class AlertCorrelator:
     """
-    Processes ONE ticket and returns feedback for that specific ticket.
+    Folds duplicate event alerts into one parent incident before anything is enriched.
+    Alerts with the same CI Name, Assignment Group and normalized description belong
+    to one storm as long as each arrives within `window` seconds of the previous one.
+    The first alert is the parent and is processed normally; the others are marked
+    Correlated, linked through 'Parent ID' and inherit the parent's assignee and
+    recommendation instead of getting their own LLM call, PDF and notification.
     """
-    if 'incidents_df' not in st.session_state or st.session_state['incidents_df'].empty:
-        return None
+    def __init__(self, store, window=CORRELATION_WINDOW_SECONDS):
+        self.store = store
+        self.window = window
+        self._open = {}    # (ci, group, description) -> [parent row id, parent TicketID, latest alert ts]
+        self._last_id = 0  # highest store row id already correlated
+        self._lock = threading.Lock()
+        self._stats = {"parents": 0, "children": 0}
 
-    df = st.session_state['incidents_df'].copy()
-    df['Status'] = df['Status'].astype(str).str.strip()
-    to_process = df[df['Status'] == 'Assigned']
-    
-    if to_process.empty:
-        return None
+    @property
+    def last_id(self):
+        return self._last_id
 
-    # Process exactly ONE incident
-    index = to_process.index[0]
-    row = to_process.iloc[0]
+    def correlate(self):
+        """Correlates the pending tickets added since the last call; returns how many became children."""
+        with self._lock:
+            rows = self.store.pending_frame(self._last_id)
+            if rows.empty:
+                return 0
+            self._last_id = int(rows.index.max())
+            alerts = rows[rows['Description'].str.lower().str.startswith(ALERT_PREFIX)]
+            if alerts.empty:
+                return 0
+
+            keys = list(zip(alerts['CI Name'], alerts['Assignment Group'], alerts['Description'].map(normalize_alert)))
+            created = pd.to_datetime(alerts['Created At'], format="%Y-%m-%d %H:%M:%S", errors='coerce')
+            created = created.fillna(pd.Timestamp.now().floor('s'))
+            stamps = created.to_numpy().astype('datetime64[s]').astype(np.int64)
+
+            # Parents from earlier calls may have been closed since: a new alert then opens a new incident
+            known = {self._open[key][0] for key in keys if key in self._open}
+            parents = self.store.fetch(known)
+            closed = set(parents.index[parents['Status'].isin(CLOSED_STATUSES)]) | (known - set(parents.index))
+
+            timestamp = datetime.now().strftime("%H:%M")
+            updates = {}
+            for index, ticket_id, key, stamp in zip(alerts.index, alerts['TicketID'], keys, stamps):
+                entry = self._open.get(key)
+                if entry is None or entry[0] in closed or stamp - entry[2] > self.window:
+                    self._open[key] = [index, ticket_id, stamp]
+                    self._stats["parents"] += 1
+                    continue
+                entry[2] = max(entry[2], stamp)
+                updates[index] = {
+                    'Status': CORRELATED_STATUS,
+                    'Parent ID': entry[0],
+                    'Notes': f"[{timestamp}] SYSTEM: Duplicate alert, correlated with {entry[1]}. Handled on the parent incident.",
+                }
+            # Parents processed meanwhile are read in the same transaction as the child write
+            self.store.link_children(updates, inherit=INHERITED_COLUMNS, closed_statuses=CLOSED_STATUSES)
+            self._stats["children"] += len(updates)
+
+            # Forget storms that have been quiet for longer than the window
+            horizon = stamps.max() - self.window
+            self._open = {key: entry for key, entry in self._open.items() if entry[2] >= horizon}
+            return len(updates)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, open_storms=len(self._open))
+
+@st.cache_resource
+def get_alert_correlator():
+    """The process-wide correlation stage shared by every session and the background workers."""
+    return AlertCorrelator(incident_store.get_incident_store())
+
+def propagate_to_children(store, updates_by_id):
+    """
+    Gives correlated children the assignee and recommendation their parent just got, or
+    parks them with a parent whose processing failed.
+    """
+    for parent_id, updates in updates_by_id.items():
+        if updates.get('Status') == 'Processing Failed':
+            store.update_children(parent_id, {'Status': 'Processing Failed'})
+        else:
+            store.update_children(parent_id, {c: updates[c] for c in INHERITED_COLUMNS if c in updates})
+
+def enrichment_item(row):
+    return {
+        'description': row['Description'],
+        'group': row['Assignment Group'],
+        'manufacturer': row.get('Manufacturer', 'Generic'),
+        'ci_type': row.get('CI Type', 'Unknown'),
+        'priority': row.get('Priority'),
+    }
+
+def resolve_ticket(row, candidates, balancer, analysis=None):
+    """
+    Works out assignee, recommendation and notes for ONE ticket row.
+    `balancer` is the scheduler.LoadBalancer that picks the least-loaded candidate,
+    `analysis` the pre-fetched LLM enrichment (fetched here when None). Returns
+    (updates, feedback) without touching the dataframe or st.session_state, so it is
+    safe to call from worker threads.
+    """
     ticket_id = row['TicketID']
-    
     group = row['Assignment Group']
-    candidates = roster.get_personnel_for_group(group)
     manufacturer = row.get('Manufacturer', 'Generic')
     ci_type = row.get('CI Type', 'Unknown')
-    
+
     feedback = {"toast": "", "voice": "", "ticket_id": ticket_id}
 
     if candidates:
-        if 'rr_state' not in st.session_state:
-            st.session_state['rr_state'] = {}
-        current_rr_index = st.session_state['rr_state'].get(group, -1)
-        next_rr_index = (current_rr_index + 1) % len(candidates)
-        assignee = candidates[next_rr_index]
-        st.session_state['rr_state'][group] = next_rr_index
-        
+        assignee = balancer.assign(candidates)
+
         status_val = 'In Progress'
-        recommendation = llm_utils.generate_resolution_steps(row['Description'], group, manufacturer, ci_type)
-        llm_note = llm_utils.generate_acknowledgment_note(row['Description'], group)
-        
+        # One structured LLM call for both the resolution and the acknowledgment note
+        if analysis is None:
+            analysis = llm_utils.generate_incident_analysis(**enrichment_item(row))
+        recommendation = analysis['resolution']
+        recommendation_source = analysis.get('source')
+        llm_note = analysis['note']
+        if analysis['priority'] and analysis['priority'] != row.get('Priority'):
+            llm_note = f"{llm_note} (Suggested priority: {analysis['priority']})"
+
         feedback["toast"] = f"✅ {ticket_id} Assigned to {assignee}"
         feedback["voice"] = f"Hi {assignee}, a new incident has been assigned to your name. Kindly check and take action. Thank you!"
         feedback["email_sent"] = True
         feedback["teams_sent"] = True
-        
+
         # Simulated Notifications (MOCK)
         # In real app: call email_api.send(...) and teams_api.post(...)
         notif_status = "[Email & Teams Sent]"
     else:
         assignee = "Unassigned"
-        status_val = 'Assigned (No Roster)' 
-        timestamp = datetime.now().strftime("%H:%M")
+        status_val = 'Assigned (No Roster)'
         shift_now = roster.determine_current_shift()
-        st.warning(f"Ticket {ticket_id}: No personnel found for '{group}' on '{shift_now}' shift.")
+        feedback["warning"] = f"Ticket {ticket_id}: No personnel found for '{group}' on '{shift_now}' shift."
         recommendation = f"ACTION REQUIRED: No personnel found for group '{group}' during '{shift_now}' shift. \n\nPlease update the Shift Roster for today's date."
+        recommendation_source = None
         llm_note = f"System could not auto-assign. Verified no '{shift_now}' shift members."
         feedback["toast"] = f"⚠️ {ticket_id} Assignment Failed"
         notif_status = "[No Personnel - Roster Alert]"
@@ -208,27 +346,49 @@ def process_tickets():
     # Pass the resolved assignee name back
     feedback['assignee_name'] = assignee
 
-    # Update Dataframe Fields
-    df.at[index, 'Status'] = status_val
-    df.at[index, 'Assigned To'] = assignee
-    df.at[index, 'Recommendation'] = recommendation
-    
     # Cumulative Notes (ALIGNED WITH SCREENSHOT)
-    current_notes = str(df.at[index, 'Notes']) if pd.notna(df.at[index, 'Notes']) else ""
+    current_notes = str(row['Notes']) if pd.notna(row.get('Notes')) else ""
     timestamp = datetime.now().strftime("%H:%M")
-    
+
     if candidates:
         notification_note = f"[{timestamp}] SYSTEM: Ticket assigned to {assignee} {notif_status}."
     else:
         notification_note = f"[{timestamp}] SYSTEM: Assignment failed (No '{roster.determine_current_shift()}' shift staff)."
-        
+
     new_note_entry = f"[{timestamp}] Agent Tina: {llm_note}\n{notification_note}".strip()
-    df.at[index, 'Notes'] = (current_notes + "\n" + new_note_entry).strip()
-    
-    # PDF
-    pdf_bytes = llm_utils.create_pdf_recommendation(ticket_id, row['Description'], recommendation, manufacturer)
-    df.at[index, 'PDF_Bytes'] = pdf_bytes
-    
-    # Store results
-    st.session_state['incidents_df'] = df
-    return feedback
+
+    updates = {
+        'Status': status_val,
+        'Assigned To': assignee,
+        'Recommendation': recommendation,
+        'Recommendation Source': recommendation_source,
+        'Notes': (current_notes + "\n" + new_note_entry).strip(),
+    }
+    return updates, feedback
+
+def mark_resolved(row_ids, balancer=None):
+    """
+    Moves open tickets to Resolved, together with the alerts correlated to them, and
+    takes them off their assignees' load. Returns the number of tickets resolved.
+    """
+    store = incident_store.get_incident_store()
+    balancer = balancer or scheduler.get_load_balancer()
+    rows = store.fetch(row_ids)
+    rows = rows[rows['Status'].isin(scheduler.OPEN_STATUSES)]
+    timestamp = datetime.now().strftime("%H:%M")
+    updates = {}
+    for index, row in rows.iterrows():
+        current_notes = str(row['Notes']) if pd.notna(row.get('Notes')) else ""
+        updates[index] = {
+            'Status': 'Resolved',
+            'Notes': (current_notes + "\n" + f"[{timestamp}] SYSTEM: Ticket resolved by {row['Assigned To']}.").strip(),
+        }
+    store.update_incidents(updates, child_updates={'Status': 'Resolved'})
+    for assignee in rows['Assigned To']:
+        balancer.release(assignee)
+    # Resolved tickets feed the local index consulted before the LLM, but only with LLM
+    # answers: a template indexed here would keep being served after Gemini recovers
+    for _, row in rows[rows['Recommendation Source'] == llm_utils.SOURCE_LLM].iterrows():
+        retrieval.RESOLUTION_INDEX.add(row['TicketID'], row['Description'], row['Assignment Group'],
+                                       row['Manufacturer'], row['CI Type'], row['Recommendation'])
+    return len(updates)
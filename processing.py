@@ -0,0 +1,226 @@
+"""
+Background ticket processing for Agent Tina.
+
+One ProcessingService per server process (see get_processing_service) owns a dispatcher
+thread and a worker pool that assign and enrich tickets independently of the Streamlit
+rerun loop. Once a session switches it on (start), the dispatcher keeps every worker
+busy until the pending queue is empty, whether or not any tab is still open: each pass
+folds new alert storms into their parents, pulls new tickets into the priority queue
+(scheduler.py) and hands a batch to every idle worker. Which tickets a worker takes is
+decided when it starts, so a Critical ticket that arrives mid-storm overtakes the Low
+ones still waiting. A worker takes up to ENRICH_BATCH_SIZE tickets at a time and
+enriches them concurrently through llm_utils.enrich_incidents (rate-limited, behind the
+circuit breaker). Workers write results straight to the shared incident store; sessions
+only poll for the notifications.
+"""
+import os
+import sys
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import incidents
+import incident_store
+import roster
+import llm_utils
+import scheduler
+
+PROCESSING_WORKERS = int(os.getenv("TINA_PROCESSING_WORKERS", "4"))
+MAX_UNREAD_RESULTS = 500  # per session, so abandoned sessions cannot grow without bound
+ENRICH_BATCH_SIZE = int(os.getenv("TINA_ENRICH_BATCH", "8"))  # tickets per work item
+DISPATCH_INTERVAL_SECONDS = float(os.getenv("TINA_DISPATCH_INTERVAL", "1"))  # also woken by start/finished work
+SESSION_IDLE_SECONDS = int(os.getenv("TINA_SESSION_IDLE", "300"))  # feedback kept for sessions that polled since
+
+class ProcessingService:
+    def __init__(self, store=None, max_workers=PROCESSING_WORKERS, balancer=None, correlator=None,
+                 shared_roster=None):
+        self.store = store or incident_store.get_incident_store()
+        self.balancer = balancer or scheduler.get_load_balancer()
+        self.correlator = correlator or incidents.get_alert_correlator()
+        self.shared_roster = shared_roster or roster.get_shared_roster()
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tina-worker")
+        self._lock = threading.Lock()
+        self._queue = scheduler.PriorityTicketQueue()
+        self._in_flight = set()  # row ids being processed, so tickets are never processed twice
+        self._busy = 0           # work items handed to the pool that have not finished
+        self._active = False
+        self._wake = threading.Event()
+        self._sessions = {}
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0}
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="tina-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def _session(self, session_key):
+        # Caller holds self._lock
+        state = self._sessions.setdefault(session_key, {
+            'results': deque(maxlen=MAX_UNREAD_RESULTS),  # feedback waiting for the session
+        })
+        state['seen'] = time.monotonic()
+        return state
+
+    def _prune_sessions(self):
+        # Caller holds self._lock; forgets sessions (closed tabs) that stopped polling
+        horizon = time.monotonic() - SESSION_IDLE_SECONDS
+        for session_key in [key for key, state in self._sessions.items() if state['seen'] < horizon]:
+            del self._sessions[session_key]
+
+    @property
+    def active(self):
+        return self._active
+
+    def start(self, session_key=None):
+        """
+        Switches the dispatcher on: it assigns every pending ticket, including ones that
+        arrive meanwhile, and switches itself off once nothing is pending or in flight.
+        The session (if given) receives the notifications until it stops polling.
+        """
+        with self._lock:
+            if session_key is not None:
+                self._session(session_key)
+            self._active = True
+        self._wake.set()
+
+    def _dispatch_loop(self):
+        while True:
+            self._wake.wait(DISPATCH_INTERVAL_SECONDS)
+            self._wake.clear()
+            try:
+                self.dispatch()
+            except Exception as e:
+                sys.stderr.write(f"[processing] dispatch failed: {e}\n")
+
+    def dispatch(self):
+        """
+        One dispatcher pass: hands a work item to every idle worker. Does nothing while
+        switched off or while no roster is loaded (pending tickets stay queued). Returns
+        the number of work items started.
+        """
+        with self._lock:
+            self._prune_sessions()
+            if not self._active:
+                return 0
+        roster_df, roster_index = self.shared_roster.get()
+        if roster_df is None or roster_df.empty:
+            return 0
+        # Fold alert storms into their parent first, so only parents reach the queue
+        self.correlator.correlate()
+        self._queue.refill(self.store, up_to_id=self.correlator.last_id)
+        with self._lock:
+            queued = len(self._queue)
+            if not queued and not self._busy:
+                self._active = False  # drained
+                return 0
+            count = min(self.max_workers - self._busy, -(-queued // ENRICH_BATCH_SIZE))
+            if count <= 0:
+                return 0
+            self._busy += count
+        for _ in range(count):
+            self._executor.submit(self._work, roster_index)
+        return count
+
+    def _work(self, roster_index):
+        try:
+            with self._lock:
+                batch = []
+                while len(batch) < ENRICH_BATCH_SIZE:
+                    index = self._queue.pop()
+                    if index is None:
+                        break
+                    batch.append(index)
+                    self._in_flight.add(index)
+                self._stats["submitted"] += len(batch)
+            if batch:
+                self._process(batch, roster_index)
+        finally:
+            with self._lock:
+                self._busy -= 1
+            self._wake.set()  # a worker is free: dispatch the next batch right away
+
+    @staticmethod
+    def _failure(ticket_id, error):
+        return {"toast": "", "voice": "", "ticket_id": ticket_id,
+                "warning": f"Ticket {ticket_id}: background processing failed ({error})."}
+
+    def _process(self, batch, roster_index):
+        results = []  # (row id, feedback, stats counter)
+        pending, tickets = list(batch), {}
+        try:
+            rows = self.store.fetch(batch)
+            # Skip tickets removed or handled elsewhere since they were queued; keep priority order
+            rows = rows[rows['Status'] == 'Assigned']
+            rows = rows.loc[[index for index in batch if index in rows.index]]
+            pending, tickets = list(rows.index), dict(zip(rows.index, rows['TicketID']))
+            results = self._resolve(rows, roster_index)
+        except Exception as e:
+            # Park the tickets so they are not queued again on every pass
+            try:
+                self.store.update_incidents({index: {'Status': 'Processing Failed'} for index in pending},
+                                            child_updates={'Status': 'Processing Failed'})
+            except Exception:
+                pass
+            results = [(index, self._failure(tickets.get(index, f"#{index}"), e), "failed") for index in pending]
+        finally:
+            # Always release the batch, or the tickets would stay in flight forever
+            with self._lock:
+                self._in_flight.difference_update(batch)
+                for index, feedback, counter in results:
+                    for state in self._sessions.values():
+                        state['results'].append(feedback)
+                    self._stats[counter] += 1
+
+    def _resolve(self, rows, roster_index):
+        """Assigns and enriches a batch of ticket rows in one store transaction."""
+        today, shift = datetime.now().date(), roster.determine_current_shift()
+        candidates = {index: roster.lookup_personnel(roster_index, group, today, shift)
+                      for index, group in zip(rows.index, rows['Assignment Group'])}
+
+        # Enrich every assignable ticket of the batch concurrently
+        to_enrich = [index for index in rows.index if candidates[index]]
+        enriched = llm_utils.enrich_incidents([incidents.enrichment_item(rows.loc[index]) for index in to_enrich])
+        analyses = dict(zip(to_enrich, enriched))
+
+        updates, results = {}, []
+        for index, row in rows.iterrows():
+            try:
+                updates[index], feedback = incidents.resolve_ticket(row, candidates[index], self.balancer,
+                                                                    analyses.get(index))
+                results.append((index, feedback, "completed"))
+            except Exception as e:
+                updates[index] = {'Status': 'Processing Failed'}
+                results.append((index, self._failure(row.get('TicketID'), e), "failed"))
+        self.store.update_incidents(updates)
+        incidents.propagate_to_children(self.store, updates)
+        return results
+
+    def drain(self, session_key):
+        """Pops the feedback of every ticket finished since the session last polled."""
+        with self._lock:
+            state = self._session(session_key)
+            results = list(state['results'])
+            state['results'].clear()
+        return results
+
+    def in_flight(self):
+        """Tickets being processed right now."""
+        with self._lock:
+            return len(self._in_flight)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, sessions=len(self._sessions), queued=len(self._queue),
+                         in_flight=len(self._in_flight), active=self._active)
+        stats["correlated"] = self.correlator.stats()["children"]
+        return stats
+
+@st.cache_resource
+def get_processing_service():
+    """The process-wide processing service, created once and shared by every session."""
+    return ProcessingService()
+
+def current_session_key():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "default"
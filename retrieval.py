@@ -0,0 +1,321 @@
+"""
+Local retrieval over past incidents for Agent Tina.
+
+ResolutionIndex remembers the recommendation of every resolved ticket in a TF-IDF
+index over its description, assignment group, CI type and manufacturer. Before an
+incident is sent to Gemini, llm_utils asks the index for a near-identical resolved
+incident; when the best match is similar enough its resolution is reused and the
+LLM call is skipped.
+
+Memory is bounded (oldest documents are evicted first) and the index can be
+persisted to a JSON file so it survives restarts.
+
+IncidentContextIndex uses the same TF-IDF core to pick the incidents the chat
+assistant gets to see, within a token budget.
+"""
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter, OrderedDict
+import streamlit as st
+import incident_store
+
+RETRIEVAL_MAX_DOCS = int(os.getenv("TINA_RETRIEVAL_MAX_DOCS", "5000"))
+RETRIEVAL_MIN_SIMILARITY = float(os.getenv("TINA_RETRIEVAL_MIN_SIMILARITY", "0.85"))
+RETRIEVAL_INDEX_PATH = os.getenv("TINA_RETRIEVAL_PATH")  # in-memory only when unset
+RETRIEVAL_SAVE_EVERY = 20  # additions between automatic saves
+
+_TOKEN_RE = re.compile(r"[a-z0-9#]+")
+STOPWORDS = frozenset("a an and are at be by for from in is it of on or the to with".split())
+
+def tokenize(text):
+    """
+    Lower-case word tokens without stopwords or the source prefixes added by
+    trigger_incidents. Digit runs become '#' so "> 20ms" and "> 25ms" match.
+    """
+    text = str(text).lower()
+    for prefix in ("[alert] ", "user reported: "):
+        if text.startswith(prefix):
+            text = text[len(prefix):]
+    text = re.sub(r"\d+", "#", text)
+    return [token for token in _TOKEN_RE.findall(text) if token not in STOPWORDS]
+
+def _words(text):
+    """Lower-case words of `text` joined by single spaces and padded, for whole-word phrase tests."""
+    return f" {' '.join(_TOKEN_RE.findall(str(text).lower()))} "
+
+class TfidfIndex:
+    """
+    Incremental TF-IDF index with an inverted posting list per term. Not thread-safe;
+    callers serialize access. Holds at most `max_docs` documents, evicting the oldest.
+    """
+    def __init__(self, max_docs=RETRIEVAL_MAX_DOCS):
+        self.max_docs = max_docs
+        self._docs = OrderedDict()  # doc id -> (term counts, payload), oldest first
+        self._postings = {}         # term -> set of doc ids
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._docs
+
+    def items(self):
+        for doc_id, (counts, payload) in self._docs.items():
+            yield doc_id, counts, payload
+
+    def add(self, doc_id, tokens, payload=None):
+        self.remove(doc_id)
+        counts = Counter(tokens)
+        self._docs[doc_id] = (counts, payload)
+        for term in counts:
+            self._postings.setdefault(term, set()).add(doc_id)
+        while len(self._docs) > self.max_docs:
+            self.remove(next(iter(self._docs)))
+
+    def remove(self, doc_id):
+        entry = self._docs.pop(doc_id, None)
+        if entry is None:
+            return
+        for term in entry[0]:
+            ids = self._postings[term]
+            ids.discard(doc_id)
+            if not ids:
+                del self._postings[term]
+
+    def clear(self):
+        self._docs.clear()
+        self._postings.clear()
+
+    def _idf(self, term):
+        return math.log((1 + len(self._docs)) / (1 + len(self._postings.get(term, ())))) + 1.0
+
+    def _weights(self, counts):
+        return {term: (1 + math.log(count)) * self._idf(term) for term, count in counts.items()}
+
+    def search(self, tokens, k=5, accept=None, max_candidates=50):
+        """
+        Top-k documents by cosine similarity to `tokens`: a list of (score, doc id,
+        payload), best first. `accept(payload)` can veto candidates. Only documents
+        sharing a term with the query are scored, and only the `max_candidates` best
+        partial scores get a full cosine.
+        """
+        query = self._weights(Counter(tokens))
+        query_norm = math.sqrt(sum(w * w for w in query.values()))
+        if not query_norm:
+            return []
+
+        dots = {}
+        for term, weight in query.items():
+            for doc_id in self._postings.get(term, ()):
+                counts = self._docs[doc_id][0]
+                dots[doc_id] = dots.get(doc_id, 0.0) + weight * (1 + math.log(counts[term])) * self._idf(term)
+
+        results = []
+        for doc_id in sorted(dots, key=dots.get, reverse=True)[:max_candidates]:
+            counts, payload = self._docs[doc_id]
+            if accept is not None and not accept(payload):
+                continue
+            doc_norm = math.sqrt(sum(w * w for w in self._weights(counts).values()))
+            results.append((dots[doc_id] / (query_norm * doc_norm), doc_id, payload))
+        results.sort(key=lambda r: r[0], reverse=True)
+        return results[:k]
+
+# ----------------------------------------------------------------------
+# Past resolutions
+# ----------------------------------------------------------------------
+class ResolutionIndex:
+    """Thread-safe index of resolved incidents and their recommendations, optionally saved to `path`."""
+    def __init__(self, path=RETRIEVAL_INDEX_PATH, max_docs=RETRIEVAL_MAX_DOCS, min_similarity=RETRIEVAL_MIN_SIMILARITY):
+        self.path = path
+        self.min_similarity = min_similarity
+        self._index = TfidfIndex(max_docs)
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self._stats = {"hits": 0, "misses": 0, "added": 0}
+        if path and os.path.exists(path):
+            self.load(path)
+
+    @staticmethod
+    def _tokens(description, group, manufacturer, ci_type):
+        # Field tokens make group / CI type / manufacturer count alongside the description words
+        return tokenize(description) + [f"group:{str(group).lower()}", f"ci:{str(ci_type).lower()}",
+                                        f"mfg:{str(manufacturer).lower()}"]
+
+    def add(self, ticket_id, description, group, manufacturer, ci_type, resolution):
+        """Indexes one resolved ticket (re-adding a TicketID replaces it)."""
+        payload = {'resolution': resolution, 'group': group, 'manufacturer': manufacturer}
+        with self._lock:
+            self._index.add(ticket_id, self._tokens(description, group, manufacturer, ci_type), payload)
+            self._stats["added"] += 1
+            self._unsaved += 1
+            save = self.path and self._unsaved >= RETRIEVAL_SAVE_EVERY
+        if save:
+            self.save()
+
+    def search(self, description, group, manufacturer="Generic", ci_type="Unknown", k=3):
+        """(score, TicketID, payload) of the closest resolved tickets of the same group and manufacturer."""
+        accept = lambda p: p['group'] == group and p['manufacturer'] == manufacturer
+        with self._lock:
+            return self._index.search(self._tokens(description, group, manufacturer, ci_type), k=k, accept=accept)
+
+    def lookup(self, description, group, manufacturer="Generic", ci_type="Unknown"):
+        """The resolution of a near-identical resolved incident, or None when nothing clears the threshold."""
+        matches = self.search(description, group, manufacturer, ci_type, k=1)
+        hit = bool(matches) and matches[0][0] >= self.min_similarity
+        with self._lock:
+            self._stats["hits" if hit else "misses"] += 1
+        return matches[0][2]['resolution'] if hit else None
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            docs = [{'id': doc_id, 'terms': dict(counts), 'payload': payload}
+                    for doc_id, counts, payload in self._index.items()]
+            self._unsaved = 0
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({'version': 1, 'docs': docs}, f)
+        os.replace(tmp_path, path)  # atomic, a crash never leaves a half-written index
+
+    def load(self, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                docs = json.load(f).get('docs', [])
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            self._index.clear()
+            for doc in docs:
+                self._index.add(doc['id'], Counter(doc['terms']).elements(), doc['payload'])
+
+    def clear(self):
+        with self._lock:
+            self._index.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(self._stats, size=len(self._index),
+                        hit_rate=(self._stats["hits"] / lookups) if lookups else 0.0)
+
+RESOLUTION_INDEX = ResolutionIndex()
+
+def get_retrieval_stats():
+    """Hit/miss counters and size of the past-resolution index."""
+    return RESOLUTION_INDEX.stats()
+
+# ----------------------------------------------------------------------
+# Chat context
+# ----------------------------------------------------------------------
+CHAT_CONTEXT_TOKENS = int(os.getenv("TINA_CHAT_CONTEXT_TOKENS", "2000"))
+CHAT_CONTEXT_TOP_K = int(os.getenv("TINA_CHAT_CONTEXT_TOP_K", "25"))
+CHAT_CONTEXT_MAX_DOCS = int(os.getenv("TINA_CHAT_CONTEXT_MAX_DOCS", "200000"))
+_TICKET_ID_RE = re.compile(r"\binc\d+\b", re.IGNORECASE)
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+def _field_token(field, value):
+    return f"{field}:{'_'.join(str(value).lower().split())}"
+
+def incident_line(row):
+    """One compact context line for an incident row."""
+    recommendation = str(row['Recommendation'] or '')
+    if len(recommendation) > 200:
+        recommendation = recommendation[:200] + "..."
+    return (f"{row['TicketID']} | {row['Status']} | {row['Priority']} | {row['Assignment Group']} | "
+            f"{row['Assigned To']} | {row['CI Name']} | {row['Description']} | Recommendation: {recommendation}")
+
+class IncidentContextIndex:
+    """
+    Chat context builder over the incident store. Keeps a TF-IDF index of every
+    incident's text plus group, status and priority field tokens, follows the store
+    incrementally through its change log, and answers each question with only the
+    most relevant incidents: tickets named in the question first, then the best text
+    matches, until the token budget is spent. The prompt size, and therefore the chat
+    latency, no longer grows with the number of incidents.
+    """
+    def __init__(self, store, max_docs=CHAT_CONTEXT_MAX_DOCS):
+        self.store = store
+        self._index = TfidfIndex(max_docs)
+        self._version = -1
+        self._phrases = {}  # field token -> phrase that selects it in a question (e.g. " in progress ")
+        self._lock = threading.Lock()
+
+    def _add_rows(self, df):
+        columns = [df[c] for c in ('Description', 'CI Name', 'Manufacturer', 'CI Type', 'Assignment Group', 'Status', 'Priority')]
+        for row_id, desc, ci_name, manufacturer, ci_type, group, status, priority in zip(df.index, *columns):
+            tokens = tokenize(f"{desc} {ci_name} {manufacturer} {ci_type}")
+            for field, value in (('group', group), ('status', status), ('priority', priority)):
+                token = _field_token(field, value)
+                if token not in self._phrases:
+                    self._phrases[token] = _words(value)
+                tokens.append(token)
+            self._index.add(row_id, tokens)
+
+    def sync(self):
+        """Brings the index up to date with the store; cheap when nothing changed."""
+        with self._lock:
+            row_ids, version = self.store.changes_since(self._version)
+            if row_ids is None:
+                self._index.clear()
+                for df in self.store.iter_frames():
+                    self._add_rows(df)
+            elif row_ids:
+                for row_id in row_ids:
+                    self._index.remove(row_id)
+                self._add_rows(self.store.fetch(row_ids))
+            self._version = version
+
+    def search(self, query, k=CHAT_CONTEXT_TOP_K):
+        """Row ids relevant to `query`: exact TicketID mentions first, then ranked text matches."""
+        self.sync()
+        exact = []
+        for ticket_id in _TICKET_ID_RE.findall(query):
+            row_id = self.store.row_id_for_ticket(ticket_id.upper())
+            if row_id is not None and row_id not in exact:
+                exact.append(row_id)
+
+        # Phrases match whole words only: "low" must not select Low tickets for "slow"
+        text = _words(query)
+        with self._lock:
+            tokens = tokenize(query) + [token for token, phrase in self._phrases.items() if phrase in text]
+            ranked = [row_id for _, row_id, _ in self._index.search(tokens, k=k + len(exact), max_candidates=4 * k)]
+        return (exact + [row_id for row_id in ranked if row_id not in exact])[:max(k, len(exact))]
+
+    def build_context(self, query, token_budget=CHAT_CONTEXT_TOKENS, k=CHAT_CONTEXT_TOP_K):
+        """Context string for one chat question, at most about `token_budget` tokens."""
+        counts = self.store.status_counts()
+        header = (f"Total incidents: {sum(counts.values())} "
+                  f"({', '.join(f'{status}: {n}' for status, n in sorted(counts.items(), key=lambda c: str(c[0])))})")
+        lines = [header]
+        used = estimate_tokens(header)
+
+        row_ids = self.search(query, k)
+        if not row_ids:
+            # Nothing matched: show the newest incidents instead
+            total = self.store.count()
+            recent = self.store.query_page(limit=k, offset=max(0, total - k))
+            row_ids = list(reversed(recent.index))
+        rows = self.store.fetch(row_ids)
+        for row_id in row_ids:
+            if row_id not in rows.index:
+                continue
+            line = incident_line(rows.loc[row_id])
+            cost = estimate_tokens(line)
+            if used + cost > token_budget:
+                break
+            lines.append(line)
+            used += cost
+        return "\n".join(lines)
+
+@st.cache_resource
+def get_incident_context_index():
+    """The process-wide chat context index over the shared incident store."""
+    return IncidentContextIndex(incident_store.get_incident_store())
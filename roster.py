@@ -1,5 +1,8 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import re
+import threading
 from datetime import datetime
 import llm_utils
 
@@ -12,65 +15,170 @@ def determine_current_shift():
     else:
         return "Night" 
 
-def get_personnel_for_group(group_name):
+SHIFT_NAMES = ["Morning", "Afternoon", "Night"]
+
+# Date formats accepted in roster column headers (same set the lookup used to probe)
+DATE_HEADER_PATTERNS = [
+    (re.compile(r"\d{4}-\d{2}-\d{2}"), "%Y-%m-%d"),
+    (re.compile(r"\d{2}-\d{2}-\d{4}"), "%d-%m-%Y"),
+    (re.compile(r"\d{2}/\d{2}/\d{4}"), "%m/%d/%Y"),
+    (re.compile(r"\d{4}/\d{2}/\d{2}"), "%Y/%m/%d"),
+]
+
+def _parse_header_date(col):
+    for pattern, fmt in DATE_HEADER_PATTERNS:
+        match = pattern.search(str(col))
+        if match:
+            try:
+                return datetime.strptime(match.group(0), fmt).date()
+            except ValueError:
+                continue
+    return None
+
+def compact_roster(df):
     """
-    Returns a list of available people for a given assignment group, 
-    filtered by Current Date and Shift with fallback logic.
+    Stores the roster's text columns as categoricals: every person x date cell becomes a
+    small integer code into the handful of shift values (Morning, WO, Leave, ...).
     """
-    if 'roster_df' not in st.session_state or st.session_state['roster_df'].empty:
-        return []
+    columns = {col: 'category' for col in df.columns
+               if df[col].dtype == object or pd.api.types.is_string_dtype(df[col].dtype)}
+    return df.astype(columns) if columns else df
+
+def _cell_matches(col, pattern):
+    """
+    Lower-cased regex search over one roster column as a boolean array. On categoricals
+    only the distinct values are searched and the result is gathered by code.
+    """
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        hits = np.asarray(col.cat.categories.astype(str).str.lower().str.contains(pattern), dtype=bool)
+        return np.append(hits, False)[col.cat.codes.to_numpy()]  # code -1 (missing) never matches
+    return col.astype(str).str.lower().str.contains(pattern, na=False).to_numpy()
+
+def build_roster_index(roster_df):
+    """
+    Precompiles a roster into a lookup keyed by (group, date, shift) -> on-duty list,
+    with the stage 1/2/3 fallbacks already resolved. Built once per roster.
+    """
+    index = {'source_id': id(roster_df), 'valid': False, 'entries': {}, 'members': {}}
+    if roster_df is None or roster_df.empty:
+        return index
 
-    df = st.session_state['roster_df'].copy()
-    
     # Skip Header/Day-name rows (where Team Name is "None" or similar)
-    df = df[df.iloc[:, 0].astype(str).str.lower() != "none"]
-    
+    df = roster_df[~_cell_matches(roster_df.iloc[:, 0], "^none$")]
+
     # Standardize Column Names (Lowercase + Strip)
-    df.columns = [str(c).lower().strip() for c in df.columns]
-    
+    columns = [str(c).lower().strip() for c in df.columns]
+
     # 1. Identify Critical Columns
-    group_col = next((c for c in df.columns if any(k in c for k in ['assignment', 'group', 'team'])), None)
-    person_col = next((c for c in df.columns if any(k in c for k in ['person', 'employee', 'staff', 'engineer', 'name']) and c != group_col), None)
-            
+    group_col = next((c for c in columns if any(k in c for k in ['assignment', 'group', 'team'])), None)
+    person_col = next((c for c in columns if any(k in c for k in ['person', 'employee', 'staff', 'engineer', 'name']) and c != group_col), None)
+
     if not (group_col and person_col):
-        return []
+        return index
 
-    # 2. Get Current Context
-    now = datetime.now()
-    # Broaden date variations to match substrings or exact dates
-    current_date_variations = [now.strftime(fmt) for fmt in ["%Y-%m-%d", "%d-%m-%Y", "%m/%d/%Y", "%Y/%m/%d"]]
-    current_shift = determine_current_shift().lower().strip()
-    target_group = group_name.lower().strip()
+    # 2. Normalize once: group names, cleaned people, and per-date shift masks
+    people = df.iloc[:, columns.index(person_col)]
+    valid_person = (people.notna() & (people.astype(str).str.lower() != 'none')).to_numpy()
+    index['people'] = people.astype(str).str.strip().to_numpy()
+    index['valid_person'] = valid_person
+    index['groups'] = df.iloc[:, columns.index(group_col)].astype(str).str.lower().to_numpy()
 
-    # 3. Find Date Column
-    today_col = None
-    for c in df.columns:
-        if any(var in str(c) for var in current_date_variations):
-            today_col = c
-            break
+    # 3. Map Date Columns (first column wins for a given date)
+    date_masks = {}
+    for pos, col in enumerate(df.columns):
+        day = _parse_header_date(col)
+        if day is None or day in date_masks:
+            continue
+        cells = df.iloc[:, pos]
+        masks = {shift.lower(): _cell_matches(cells, shift.lower()) for shift in SHIFT_NAMES}
+        # STAGE 2 mask: anyone working (not WO, not Leave)
+        masks['working'] = ~_cell_matches(cells, 'wo|leave|none|thursday|friday|saturday|sunday')
+        # STAGE 3 mask: anyone not explicitly on 'Leave'
+        masks['available'] = ~_cell_matches(cells, 'leave')
+        date_masks[day] = masks
+    index['date_masks'] = date_masks
+    index['valid'] = True
 
-    # 4. Filter Logic
-    mask = df[group_col].astype(str).str.lower().str.contains(target_group, na=False)
-    
-    if today_col:
-        # STAGE 1: Exact Shift Match
-        shift_mask = df[today_col].astype(str).str.lower().str.contains(current_shift, na=False)
-        candidates = df[mask & shift_mask][person_col].tolist()
-        
-        # STAGE 2: Fallback to anyone working (not WO, not Leave)
-        if not candidates:
-            working_mask = ~df[today_col].astype(str).str.lower().str.contains('wo|leave|none|thursday|friday|saturday|sunday', na=False)
-            candidates = df[mask & working_mask][person_col].tolist()
-
-        # STAGE 3: Emergency Fallback to anyone not explicitly on 'Leave'
-        if not candidates:
-            available_mask = ~df[today_col].astype(str).str.lower().str.contains('leave', na=False)
-            candidates = df[mask & available_mask][person_col].tolist()
-    else:
+    # 4. Resolve the known assignment groups up front
+    for group in llm_utils.ASSIGNMENT_GROUPS:
+        _index_group(index, group.lower().strip())
+    return index
+
+def _index_group(index, target_group):
+    """Resolves every (date, shift) entry for one group into the index."""
+    group_mask = np.char.find(index['groups'].astype(str), target_group) >= 0
+    people = index['people']
+    base = group_mask & index['valid_person']
+    index['members'][target_group] = people[base].tolist()
+
+    for day, masks in index['date_masks'].items():
+        # STAGE 2 / STAGE 3 fallbacks do not depend on the shift, resolve them once per date
+        working = people[base & masks['working']].tolist()
+        fallback = working if working else people[base & masks['available']].tolist()
+        for shift in SHIFT_NAMES:
+            shift_key = shift.lower()
+            # STAGE 1: Exact Shift Match
+            on_shift = people[base & masks[shift_key]].tolist()
+            index['entries'][(target_group, day, shift_key)] = on_shift if on_shift else fallback
+
+class SharedRoster:
+    """
+    The active roster of the whole server process, like the incident store: the pending
+    queue is shared by every session, so every session must assign from the same roster.
+    """
+    def __init__(self):
+        self._df = None
+        self._index = None
+        self._lock = threading.Lock()
+
+    def set(self, df):
+        df = compact_roster(df)
+        index = build_roster_index(df)
+        with self._lock:
+            self._df, self._index = df, index
+
+    def get(self):
+        """(roster frame, lookup index), or (None, None) when no roster has been loaded."""
+        with self._lock:
+            return self._df, self._index
+
+@st.cache_resource
+def get_shared_roster():
+    return SharedRoster()
+
+def get_roster():
+    """The active roster DataFrame, or None when none is loaded (or it is empty)."""
+    df, _ = get_shared_roster().get()
+    return None if df is None or df.empty else df
+
+def get_roster_index():
+    """The lookup index of the active roster, or None when none is loaded."""
+    df, index = get_shared_roster().get()
+    return None if df is None or df.empty else index
+
+def set_roster(df):
+    """Replaces the active roster for every session (stored compactly) and rebuilds its lookup index."""
+    get_shared_roster().set(df)
+
+def lookup_personnel(index, group_name, day, shift):
+    """O(1) lookup of the on-duty list for (group, date, shift) in a prebuilt roster index."""
+    if not index or not index['valid']:
+        return []
+    target_group = group_name.lower().strip()
+    if target_group not in index['members']:
+        _index_group(index, target_group)
+
+    if day not in index['date_masks']:
         # If no date column found, just return people in the group
-        candidates = df[mask][person_col].tolist()
-        
-    return [str(p).strip() for p in candidates if pd.notna(p) and str(p).lower() != 'none']
+        return list(index['members'][target_group])
+    return list(index['entries'][(target_group, day, shift.lower().strip())])
+
+def get_personnel_for_group(group_name):
+    """
+    Returns a list of available people for a given assignment group, 
+    filtered by Current Date and Shift with fallback logic.
+    """
+    return lookup_personnel(get_roster_index(), group_name, datetime.now().date(), determine_current_shift())
 
 def generate_dummy_roster(month_name, year):
     # Map Month Name to Number
@@ -132,7 +240,7 @@ def generate_dummy_roster(month_name, year):
             rows.append(person_schedule)
             
     df = pd.DataFrame(rows)
-    st.session_state['roster_df'] = df
+    set_roster(df)
     st.success(f"Generated Dummy Roster for {month_name} {year}!")
     st.rerun()
 
@@ -171,7 +279,7 @@ def render_roster_page():
                             else:
                                 df = pd.read_excel(uploaded_file)
                             
-                            st.session_state['roster_df'] = df
+                            set_roster(df)
                             st.session_state['last_processed_file'] = file_key
                             st.success("Roster Uploaded Successfully!")
                             st.rerun()
@@ -180,7 +288,8 @@ def render_roster_page():
     
     # Logic handled inside the block above to avoid scoping issues and infinite loops
     
-    if 'roster_df' in st.session_state:
+    df = get_roster()
+    if df is not None:
         st.subheader("Current Roster View")
         
         # Color Coding Logic
@@ -201,7 +310,6 @@ def render_roster_page():
                 return 'background-color: #f3e8ff; color: #581c87; font-weight: bold;' # Purple
             return ''
 
-        df = st.session_state['roster_df']
         # Apply Style
         styled_df = df.style.map(highlight_shifts)
         
@@ -0,0 +1,159 @@
+"""
+Priority work queue for Agent Tina.
+
+Pending tickets are handed out Critical-first instead of oldest-first. Each ticket is
+keyed on (priority, created-at) with linear aging: waiting PRIORITY_AGING_SECONDS
+counts as much as one priority level, so a Low ticket is eventually served ahead of
+fresh Critical ones and cannot starve during a storm.
+
+Because the aging is linear in the creation time, the key of a ticket never changes
+(created_ts + rank * aging), so a plain binary heap keeps the order: push and pop
+are O(log n) and the store is only read incrementally for tickets it has not seen.
+
+The LoadBalancer below decides who gets a ticket once it is taken off the queue.
+"""
+import os
+import heapq
+import threading
+from datetime import datetime
+import streamlit as st
+import incident_store
+
+PRIORITY_RANK = {'Critical': 0, 'High': 1, 'Medium': 2, 'Low': 3}
+PRIORITY_AGING_SECONDS = float(os.getenv("TINA_PRIORITY_AGING_SECONDS", "300"))
+OPEN_STATUSES = ('In Progress',)  # statuses that count against the assignee's load
+
+def _created_ts(created_at):
+    try:
+        return datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S").timestamp()
+    except (TypeError, ValueError):
+        return datetime.now().timestamp()
+
+def priority_key(priority, created_at, aging_seconds=PRIORITY_AGING_SECONDS):
+    """Heap key: earlier is served first. Unknown priorities rank as Medium."""
+    rank = PRIORITY_RANK.get(priority, PRIORITY_RANK['Medium'])
+    return _created_ts(created_at) + rank * aging_seconds
+
+class PriorityTicketQueue:
+    """Thread-safe min-heap of pending ticket row ids, fed incrementally from the incident store."""
+    def __init__(self, aging_seconds=PRIORITY_AGING_SECONDS):
+        self.aging_seconds = aging_seconds
+        self._heap = []
+        self._queued = set()
+        self._last_id = 0  # highest store row id already pulled in
+        self._lock = threading.Lock()
+        self._refill_lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._heap)
+
+    def push(self, row_id, priority, created_at):
+        with self._lock:
+            if row_id in self._queued:
+                return
+            self._queued.add(row_id)
+            heapq.heappush(self._heap, (priority_key(priority, created_at, self.aging_seconds), row_id))
+
+    def pop(self):
+        """Row id of the most urgent queued ticket, or None when the queue is empty."""
+        with self._lock:
+            if not self._heap:
+                return None
+            _, row_id = heapq.heappop(self._heap)
+            self._queued.discard(row_id)
+            return row_id
+
+    def refill(self, store, up_to_id=None):
+        """
+        Pulls in tickets added to the store since the last call (only up to `up_to_id`,
+        e.g. the last row the correlation stage has seen); returns how many were queued.
+        """
+        with self._refill_lock:
+            rows = store.pending_since(self._last_id, up_to_id)
+            for row_id, priority, created_at in rows:
+                self.push(row_id, priority, created_at)
+            if rows:
+                self._last_id = rows[-1][0]
+        return len(rows)
+
+# ----------------------------------------------------------------------
+# Load-aware assignment
+# ----------------------------------------------------------------------
+class LoadBalancer:
+    """
+    Assigns each ticket to the on-duty engineer holding the fewest open tickets, ties
+    going to whoever was assigned least recently. Open-ticket counters are updated
+    incrementally: assign() adds one, release() (ticket Resolved) removes one.
+
+    Every distinct on-duty list gets its own lazy min-heap of (open, last assigned,
+    name, version) entries. A counter change bumps the engineer's version and pushes
+    a fresh entry into each heap they belong to; outdated entries are dropped when
+    they surface, so picking is O(log k) for k engineers on shift.
+    """
+    def __init__(self, open_counts=None):
+        self._open = dict(open_counts or {})
+        self._last = {}       # name -> tick of the latest assignment
+        self._version = {}
+        self._heaps = {}      # sorted on-duty names -> heap
+        self._member_of = {}  # name -> heap keys containing it
+        self._tick = 0
+        self._lock = threading.Lock()
+
+    def _entry(self, name):
+        return (self._open.get(name, 0), self._last.get(name, 0), name, self._version.get(name, 0))
+
+    def _heap_for(self, candidates):
+        key = tuple(sorted(set(candidates)))
+        heap = self._heaps.get(key)
+        if heap is None:
+            heap = [self._entry(name) for name in key]
+            heapq.heapify(heap)
+            self._heaps[key] = heap
+            for name in key:
+                self._member_of.setdefault(name, []).append(key)
+        return heap
+
+    def _changed(self, name):
+        # Caller holds self._lock
+        self._version[name] = self._version.get(name, 0) + 1
+        entry = self._entry(name)
+        for key in self._member_of.get(name, ()):
+            heap = self._heaps[key]
+            heapq.heappush(heap, entry)
+            if len(heap) > 4 * len(key) + 16:  # drop accumulated outdated entries
+                heap[:] = [e for e in heap if e[3] == self._version.get(e[2], 0)]
+                heapq.heapify(heap)
+
+    def assign(self, candidates):
+        """Picks the least-loaded of `candidates` and counts the new ticket against them."""
+        if not candidates:
+            return None
+        with self._lock:
+            heap = self._heap_for(candidates)
+            while heap[0][3] != self._version.get(heap[0][2], 0):
+                heapq.heappop(heap)
+            name = heap[0][2]
+            self._tick += 1
+            self._last[name] = self._tick
+            self._open[name] = self._open.get(name, 0) + 1
+            self._changed(name)
+            return name
+
+    def release(self, name):
+        """One of `name`'s tickets was resolved (or reassigned away)."""
+        with self._lock:
+            if self._open.get(name, 0) <= 0:
+                return
+            self._open[name] -= 1
+            self._changed(name)
+
+    def loads(self):
+        """Snapshot of open tickets per engineer."""
+        with self._lock:
+            return {name: count for name, count in self._open.items() if count}
+
+@st.cache_resource
+def get_load_balancer():
+    """The process-wide balancer, seeded with the open tickets already in the store."""
+    return LoadBalancer(incident_store.get_incident_store().open_ticket_counts(OPEN_STATUSES))
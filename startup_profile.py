@@ -0,0 +1,80 @@
+"""
+Import-time profile of the Streamlit entry point (set TINA_PROFILE_IMPORTS=1).
+
+enable() wraps the import machinery so every module imported from then on is timed,
+both inclusive of the modules it pulls in and on its own (like `python -X importtime`).
+app.py enables it before its own imports and reports once the first page has run: the
+table goes to the server log and into an expander on the page. Modules imported before
+app.py runs (Streamlit itself) are not covered.
+"""
+import os
+import sys
+import time
+import builtins
+import threading
+
+PROFILE_IMPORTS = os.getenv("TINA_PROFILE_IMPORTS", "").lower() in ("1", "true", "yes")
+PROFILE_TOP = int(os.getenv("TINA_PROFILE_TOP", "25"))
+
+_IMPORT_TIMES = {}  # module -> [inclusive seconds, self seconds]
+_STARTED = None
+_FIRST_PAGE_MS = None  # from enable() to the end of the first page run
+_LOCAL = threading.local()
+_LOCK = threading.Lock()
+_original_import = builtins.__import__
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level or name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+    stack = getattr(_LOCAL, "stack", None)
+    if stack is None:
+        stack = _LOCAL.stack = []
+    stack.append(0.0)  # time spent in nested imports
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - start
+        nested = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        with _LOCK:
+            _IMPORT_TIMES.setdefault(name, [elapsed, elapsed - nested])
+
+def enable():
+    """Starts timing imports when TINA_PROFILE_IMPORTS is set; safe to call on every rerun."""
+    global _STARTED
+    if not PROFILE_IMPORTS or _STARTED is not None:
+        return
+    _STARTED = time.perf_counter()
+    builtins.__import__ = _timed_import
+
+def report(top=PROFILE_TOP):
+    """The `top` slowest imports as (module, inclusive ms, self ms), slowest first by own time."""
+    with _LOCK:
+        rows = [(name, total * 1000, own * 1000) for name, (total, own) in _IMPORT_TIMES.items()]
+    rows.sort(key=lambda row: row[2], reverse=True)
+    return rows[:top]
+
+def format_report(top=PROFILE_TOP):
+    """report() as a fixed-width text table."""
+    lines = [f"{'module':<48} {'incl ms':>9} {'self ms':>9}"]
+    lines += [f"{name:<48} {total:>9.1f} {own:>9.1f}" for name, total, own in report(top)]
+    lines.append(f"{len(_IMPORT_TIMES)} modules imported; first page ready after {_FIRST_PAGE_MS or 0:.0f} ms")
+    return "\n".join(lines)
+
+def report_once():
+    """
+    Call at the end of a page run: prints the profile to the server log the first time,
+    and returns it as text (None when profiling is off).
+    """
+    global _FIRST_PAGE_MS
+    if _STARTED is None:
+        return None
+    first = _FIRST_PAGE_MS is None
+    if first:
+        _FIRST_PAGE_MS = (time.perf_counter() - _STARTED) * 1000
+    text = format_report()
+    if first:
+        sys.stderr.write(f"[startup profile]\n{text}\n")
+    return text
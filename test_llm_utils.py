@@ -0,0 +1,143 @@
+"""
+Tests for the concurrent enrichment path of llm_utils, run against FakeLLM (no API key
+or network needed): python -m pytest -q test_llm_utils.py
+"""
+import re
+import json
+import time
+import uuid
+import asyncio
+import threading
+from types import SimpleNamespace
+import llm_utils
+
+class FakeLLM:
+    """
+    Offline stand-in for the Gemini client with injectable latency and errors, for local
+    testing and load runs of the enrichment path: enrich_incidents(items, llm=FakeLLM(latency=0.5)).
+    """
+    def __init__(self, response=None, latency=0.0, error=None):
+        self.response = response or json.dumps({
+            'note': "Ticket assigned and investigation has begun.",
+            'resolution': "1. *Triage*: Review recent alerts.\n2. *Restore*: Restart the affected service.",
+            'priority': "Medium",
+        })
+        self.latency = latency
+        self.error = error  # exception raised after the latency, to simulate an outage
+        self.calls = 0
+        self.active = 0
+        self.peak = 0  # most calls in progress at the same time
+        self._lock = threading.Lock()
+
+    def _enter(self):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+
+    def _exit(self):
+        with self._lock:
+            self.active -= 1
+
+    def invoke(self, prompt):
+        self._enter()
+        try:
+            time.sleep(self.latency)
+            if self.error:
+                raise self.error
+            return SimpleNamespace(content=self.response)
+        finally:
+            self._exit()
+
+    async def ainvoke(self, prompt):
+        self._enter()
+        try:
+            await asyncio.sleep(self.latency)
+            if self.error:
+                raise self.error
+            return SimpleNamespace(content=self.response)
+        finally:
+            self._exit()
+
+    def _chunks(self):
+        words = re.findall(r"\S+\s*", self.response)
+        return words, self.latency / max(1, len(words))
+
+    def stream(self, prompt):
+        self.calls += 1
+        words, delay = self._chunks()
+        for i, word in enumerate(words):
+            time.sleep(delay)
+            if self.error and i == len(words) // 2:
+                raise self.error
+            yield SimpleNamespace(content=word)
+
+    async def astream(self, prompt):
+        self.calls += 1
+        words, delay = self._chunks()
+        for i, word in enumerate(words):
+            await asyncio.sleep(delay)
+            if self.error and i == len(words) // 2:
+                raise self.error
+            yield SimpleNamespace(content=word)
+
+class LoopBoundLLM(FakeLLM):
+    """Fails like a real async client when used from an event loop other than its first one."""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.loop = None
+
+    async def ainvoke(self, prompt):
+        loop = asyncio.get_running_loop()
+        if self.loop is None:
+            self.loop = loop
+        elif loop is not self.loop:
+            raise RuntimeError("attached to a different loop")
+        return await super().ainvoke(prompt)
+
+def _items(count):
+    # Unique descriptions, so neither the response cache nor the resolution index answers
+    run = uuid.uuid4().hex
+    return [{'description': f"Disk latency alert {run} #{i}", 'group': "Storage Team",
+             'manufacturer': "NetApp", 'ci_type': "Storage Array"} for i in range(count)]
+
+def _from_llm(analyses):
+    return all(a['note'] == "Ticket assigned and investigation has begun." for a in analyses)
+
+def test_enrichment_respects_concurrency_cap():
+    llm = FakeLLM(latency=0.1)
+    bucket = llm_utils.TokenBucket(rate=1000, capacity=100)
+    start = time.monotonic()
+    analyses = llm_utils.enrich_incidents(_items(9), max_concurrency=3, llm=llm, rate_limiter=bucket)
+    elapsed = time.monotonic() - start
+    assert _from_llm(analyses) and len(analyses) == 9
+    assert llm.calls == 9
+    assert llm.peak == 3
+    assert 0.3 <= elapsed < 0.9  # three waves of 0.1s, not nine serial calls
+
+def test_enrichment_is_rate_limited():
+    llm = FakeLLM()
+    bucket = llm_utils.TokenBucket(rate=20, capacity=1)
+    start = time.monotonic()
+    analyses = llm_utils.enrich_incidents(_items(6), max_concurrency=6, llm=llm, rate_limiter=bucket)
+    assert _from_llm(analyses)
+    assert time.monotonic() - start >= 5 / 20 * 0.9  # one burst token, then 20 per second
+
+def test_enrichment_from_many_threads_shares_one_event_loop():
+    llm = LoopBoundLLM(latency=0.05)
+    bucket = llm_utils.TokenBucket(rate=1000, capacity=100)
+    results = []
+
+    def worker():
+        for _ in range(2):
+            results.append(llm_utils.enrich_incidents(_items(4), llm=llm, rate_limiter=bucket))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 8
+    assert all(_from_llm(analyses) for analyses in results)
+    assert llm.calls == 32
+    assert llm.peak <= llm_utils.LLM_MAX_CONCURRENCY  # the default cap is shared by every caller